@@ -0,0 +1,111 @@
+# filename: app/calibrate_password_hash.py
+"""
+Pick the password hashing cost for this hardware.
+
+    cd python_project
+    python -m app.calibrate_password_hash --target-ms 250
+    python -m app.calibrate_password_hash --scheme argon2 --target-ms 250 --memory-kib 19456
+
+Times one hash at increasing costs (bcrypt rounds, or argon2id time cost at a
+fixed memory cost and parallelism), picks the highest cost whose median time
+stays within the budget, and prints the settings to deploy. Run it on the
+machines that serve logins, while they are otherwise idle. Existing hashes are
+upgraded to the new cost as users log in.
+"""
+import sys
+import os
+
+# Add the project root to sys.path to allow imports from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+import argparse
+import statistics
+import time
+
+from app.core.config import settings
+from app.core.security import PASSWORD_HASH_SCHEMES
+
+SAMPLE_PASSWORD = "calibration-password-1234"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Choose the password hashing cost for a latency budget.")
+    parser.add_argument("--scheme", choices=PASSWORD_HASH_SCHEMES, default=settings.PASSWORD_HASH_SCHEME)
+    parser.add_argument("--target-ms", type=float, default=250, help="latency budget of one hash")
+    parser.add_argument("--samples", type=int, default=3, help="hashes timed per cost (median is used)")
+    parser.add_argument("--min-cost", type=int, default=None,
+                        help="lowest cost to consider (default: 10 bcrypt rounds, argon2 time cost 1)")
+    parser.add_argument("--max-cost", type=int, default=None,
+                        help="highest cost to consider (default: 16 bcrypt rounds, argon2 time cost 10)")
+    parser.add_argument("--memory-kib", type=int, default=settings.ARGON2_MEMORY_COST, help="argon2 memory cost")
+    parser.add_argument("--parallelism", type=int, default=settings.ARGON2_PARALLELISM, help="argon2 lanes")
+    return parser.parse_args(argv)
+
+
+def hasher(args, cost):
+    if args.scheme == "bcrypt":
+        from passlib.hash import bcrypt
+
+        return bcrypt.using(rounds=cost)
+    from passlib.hash import argon2
+
+    if not argon2.has_backend():
+        raise SystemExit("argon2 needs the argon2-cffi package (pip install argon2-cffi)")
+    return argon2.using(type="ID", rounds=cost, memory_cost=args.memory_kib, parallelism=args.parallelism)
+
+
+def time_hash(handler, samples):
+    """Median milliseconds of one hash."""
+    handler.hash(SAMPLE_PASSWORD)  # warm up (backend loading)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        handler.hash(SAMPLE_PASSWORD)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(args):
+    """[(cost, median ms)] in increasing cost, stopping at the first cost over the budget."""
+    low = args.min_cost if args.min_cost is not None else (10 if args.scheme == "bcrypt" else 1)
+    high = args.max_cost if args.max_cost is not None else (16 if args.scheme == "bcrypt" else 10)
+    measured = []
+    for cost in range(low, high + 1):
+        ms = time_hash(hasher(args, cost), args.samples)
+        measured.append((cost, ms))
+        print(f"  cost {cost:>2}: {ms:8.1f} ms")
+        if ms > args.target_ms:
+            break
+    return measured
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    label = "rounds" if args.scheme == "bcrypt" else f"time cost (memory {args.memory_kib} KiB, parallelism {args.parallelism})"
+    print(f"Timing {args.scheme} {label}, budget {args.target_ms:g} ms per hash:")
+    measured = calibrate(args)
+
+    within = [(cost, ms) for cost, ms in measured if ms <= args.target_ms]
+    if within:
+        cost, ms = within[-1]
+    else:
+        cost, ms = measured[0]
+        print(f"Even the lowest cost takes {ms:.1f} ms, over the budget; using it anyway.")
+
+    per_second = settings.PASSWORD_HASH_WORKERS * 1000 / ms
+    print(f"\nChosen cost {cost} ({ms:.1f} ms per hash, about {per_second:.0f} logins/s per worker process "
+          f"with PASSWORD_HASH_WORKERS={settings.PASSWORD_HASH_WORKERS}).")
+    print("Deploy with:")
+    print(f"  PASSWORD_HASH_SCHEME={args.scheme}")
+    if args.scheme == "bcrypt":
+        print(f"  BCRYPT_ROUNDS={cost}")
+    else:
+        print(f"  ARGON2_TIME_COST={cost}")
+        print(f"  ARGON2_MEMORY_COST={args.memory_kib}")
+        print(f"  ARGON2_PARALLELISM={args.parallelism}")
+
+
+if __name__ == "__main__":
+    main()
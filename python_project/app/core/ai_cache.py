@@ -0,0 +1,218 @@
+# filename: app/core/ai_cache.py
+"""
+Cache of AI announcement generations, addressed by content.
+
+The key is a SHA-256 of (model, system prompt version, normalized input,
+teacher name), so a repeated "regenerate" on the same text, or a colleague
+submitting the same notice, is answered without calling the model. Changing
+the model or the prompt changes every key; old entries simply age out.
+
+Two tiers:
+
+- memory: per worker, LRU of AI_CACHE_SIZE entries kept for AI_CACHE_TTL_SECONDS;
+- disk (optional): a SQLite file (AI_CACHE_SQLITE_PATH) shared by the workers on
+  the host and kept across restarts, entries kept for AI_CACHE_DISK_TTL_SECONDS.
+  A disk hit is copied into memory.
+
+Concurrent misses for the same key wait for the first one instead of each
+calling the model, and get its text (or its error) from it directly, so
+this works with the memory tier disabled too. Failed generations are not
+cached.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+from app.core.config import Settings, settings
+from app.core.metrics import register_metrics
+
+
+def normalize_input(text: str) -> str:
+    """The text with line endings, spaces and blank lines made uniform."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    lines = [" ".join(line.split()) for line in text.split("\n")]
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+
+
+def cache_key(model: str, prompt_version: str, normalized_input: str, teacher_name: str) -> str:
+    material = json.dumps([model, prompt_version, normalized_input, teacher_name], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    """key -> text for ttl seconds, bounded to max_size entries (LRU)."""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+
+    def get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(key, None)
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, key: str, text: str) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteTier:
+    """key -> text in a SQLite file; queries run in a thread, off the event loop."""
+
+    CLEANUP_PROBABILITY = 0.01  # share of writes that also delete expired entries
+
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ai_generations ("
+                " key TEXT PRIMARY KEY, text TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def _get(self, key: str) -> str | None:
+        row = self._connection().execute(
+            "SELECT text FROM ai_generations WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def _put(self, key: str, text: str) -> None:
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO ai_generations (key, text, expires_at) VALUES (?, ?, ?)",
+            (key, text, now + self.ttl),
+        )
+        if random.random() < self.CLEANUP_PROBABILITY:
+            connection.execute("DELETE FROM ai_generations WHERE expires_at <= ?", (now,))
+
+    async def get(self, key: str) -> str | None:
+        return await asyncio.to_thread(self._get, key)
+
+    async def put(self, key: str, text: str) -> None:
+        if self.ttl > 0:
+            await asyncio.to_thread(self._put, key, text)
+
+
+class GenerationCache:
+    def __init__(self, memory: MemoryTier, disk: SQLiteTier | None = None):
+        self.memory = memory
+        self.disk = disk
+        self._pending: dict[str, asyncio.Future] = {}  # key -> outcome of its running generation
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "disk_errors": 0}
+
+    async def get(self, key: str) -> str | None:
+        text = self.memory.get(key)
+        if text is not None:
+            self._stats["memory_hits"] += 1
+            return text
+        if self.disk is not None:
+            try:
+                text = await self.disk.get(key)
+            except sqlite3.Error as exc:
+                # The disk tier is an optimization: answer from the model instead
+                self._stats["disk_errors"] += 1
+                print(f"AI cache read error: {exc}")
+            if text is not None:
+                self._stats["disk_hits"] += 1
+                self.memory.put(key, text)
+                return text
+        self._stats["misses"] += 1
+        return None
+
+    async def put(self, key: str, text: str) -> None:
+        self.memory.put(key, text)
+        if self.disk is not None:
+            try:
+                await self.disk.put(key, text)
+            except sqlite3.Error as exc:
+                self._stats["disk_errors"] += 1
+                print(f"AI cache write error: {exc}")
+
+    async def get_or_generate(self, key: str, generate: Callable[[], Awaitable[str]]) -> tuple[str, bool]:
+        """(text, whether it came from the cache); generate() is awaited on a miss."""
+        text = await self.get(key)
+        if text is not None:
+            return text, True
+
+        running = self._pending.get(key)
+        if running is not None:
+            # The same generation is already on its way: share its outcome.
+            # shield(): a waiter that gives up must not cancel it for the others
+            try:
+                text = await asyncio.shield(running)
+            except asyncio.CancelledError:
+                if not running.cancelled():
+                    raise  # this request was cancelled
+                # The first request went away: the next one to get here takes over
+                return await self.get_or_generate(key, generate)
+            self._stats["coalesced"] += 1
+            return text, True
+
+        outcome = self._pending[key] = asyncio.get_running_loop().create_future()
+        try:
+            text = await generate()
+            await self.put(key, text)
+        except asyncio.CancelledError:
+            outcome.cancel()
+            raise
+        except Exception as exc:
+            outcome.set_exception(exc)
+            outcome.exception()  # marks it retrieved: no "never retrieved" warning without waiters
+            raise
+        else:
+            outcome.set_result(text)
+        finally:
+            del self._pending[key]
+        return text, False
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self.memory),
+            "max_size": self.memory.max_size,
+            "ttl_seconds": self.memory.ttl,
+            "disk": self.disk.path if self.disk is not None else None,
+            **self._stats,
+        }
+
+
+def create_cache(app_settings: Settings = settings) -> GenerationCache:
+    disk = None
+    if app_settings.AI_CACHE_SQLITE_PATH:
+        disk = SQLiteTier(app_settings.AI_CACHE_SQLITE_PATH, app_settings.AI_CACHE_DISK_TTL_SECONDS)
+    return GenerationCache(MemoryTier(app_settings.AI_CACHE_SIZE, app_settings.AI_CACHE_TTL_SECONDS), disk)
+
+
+generation_cache = create_cache()
+
+register_metrics("ai_cache", generation_cache.stats)
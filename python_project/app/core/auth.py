@@ -1,10 +1,205 @@
 # filename: app/core/auth.py
+"""
+Access tokens: issuing them at login and verifying them on every request.
+
+Routers depend on get_current_principal() and read the caller from the
+returned Principal instead of decoding the JWT themselves. Verified claims are
+kept in a bounded LRU keyed by a digest of the token, so repeated requests with
+the same token skip the HMAC check and JSON parsing; an entry is only used
+until the token's exp.
+
+Tokens with a scope claim are good for that one purpose only: a stream ticket
+(scope "stream") opens the event stream, where the URL and thus the access
+logs carry it, but is refused everywhere else.
+
+Handlers that need the caller's user record depend on get_current_user(),
+which loads it by primary key. FastAPI resolves a dependency once per request,
+and the record is also cached across requests for USER_CACHE_TTL_SECONDS.
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from jose import jwt  # type: ignore
+
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt  # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession
+
 from app.core.config import settings
+from app.core.database import get_db
+from app.core.metrics import register_metrics
+from app.models.user import User
+from app.schemas.user import UserOut
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+# For endpoints that also accept another credential (e.g. ?ticket= on the event stream)
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+# Scope of the tickets that open the announcement event stream
+STREAM_SCOPE = "stream"
+
 
 def create_access_token(data: dict, expires_delta: int = 3600):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(seconds=expires_delta)
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALGORITHM)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The caller, as stated by a verified access token."""
+    user_id: int
+    username: str
+    role: str
+    expires_at: float  # Unix time
+    scope: str | None = None  # None for access tokens
+
+
+class TokenCache:
+    """LRU of verified tokens (by digest) -> Principal, bounded to max_size entries."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[bytes, Principal] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, key: bytes) -> Principal | None:
+        principal = self._entries.get(key)
+        if principal is None:
+            self.misses += 1
+            return None
+        if principal.expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return principal
+
+    def put(self, key: bytes, principal: Principal) -> None:
+        if self.max_size <= 0:
+            return
+        self._entries[key] = principal
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+token_cache = TokenCache(settings.TOKEN_CACHE_SIZE)
+register_metrics("token_cache", token_cache.stats)
+
+
+def _invalid_token() -> HTTPException:
+    return HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def decode_token(token: str, scope: str | None = None) -> Principal:
+    """The Principal of a valid, unexpired token for scope (None: an access token); 401 otherwise."""
+    key = TokenCache.key(token)
+    principal = token_cache.get(key)
+    if principal is not None:
+        if principal.scope != scope:
+            raise _invalid_token()
+        return principal
+    try:
+        claims = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+        principal = Principal(
+            user_id=int(claims["user_id"]),
+            username=str(claims["sub"]),
+            role=str(claims["role"]),
+            expires_at=float(claims["exp"]),
+            scope=claims.get("scope"),
+        )
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise _invalid_token()
+    token_cache.put(key, principal)
+    if principal.scope != scope:
+        raise _invalid_token()
+    return principal
+
+
+async def get_current_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    return decode_token(token)
+
+
+class UserCache:
+    """
+    user_id -> UserOut for ttl seconds, bounded to max_size entries (LRU).
+    Per worker: a change made through another worker shows after at most ttl.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[int, tuple[float, UserOut]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int) -> UserOut | None:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[0] <= time.monotonic():
+            self._entries.pop(user_id, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, user: UserOut) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        self._entries[user.id] = (time.monotonic() + self.ttl, user)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "max_size": self.max_size, "ttl_seconds": self.ttl,
+                "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL_SECONDS)
+register_metrics("user_cache", user_cache.stats)
+
+
+async def get_current_user(
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+) -> UserOut:
+    """
+    The caller's user record (without the password hash), loaded by primary key.
+    Call user_cache.invalidate() after changing a user.
+    """
+    user = user_cache.get(principal.user_id)
+    if user is not None:
+        return user
+    row = await db.get(User, principal.user_id)
+    if row is None:  # deleted since the token was issued
+        raise _invalid_token()
+    user = UserOut.model_validate(row)
+    user_cache.put(user)
+    return user
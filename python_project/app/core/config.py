@@ -6,21 +6,155 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value.strip() == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
 class Settings:
     PROJECT_NAME: str = "Klasstra"
     SQLALCHEMY_DATABASE_URI: str = os.getenv("DATABASE_URL", "postgresql+psycopg2://YOUR_DB_CONNECTION_STRING")
-    
+    # URL for the async engine used by request handlers; derived from DATABASE_URL
+    # (psycopg2 -> asyncpg, sqlite -> aiosqlite) when not set.
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
+
+    # Optional read replicas (comma-separated URLs) for read-only endpoints
+    DATABASE_REPLICA_URLS: list[str] = [
+        url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+    ]
+    # After a client writes, its reads stay on the primary for this long (replica lag budget).
+    # The pin is kept in the rate limiter's store (RATE_LIMIT_BACKEND) so every worker sees it
+    REPLICA_READ_AFTER_WRITE_SECONDS: float = float(os.getenv("REPLICA_READ_AFTER_WRITE_SECONDS", "5"))
+
+    # Connection pool of the request-serving engine, per worker process
+    # (size the database's max_connections for WEB_CONCURRENCY * (size + overflow)).
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # seconds to wait for a connection
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 disables
+    # "always", "idle" (only connections idle longer than the threshold) or "never"
+    DB_POOL_PRE_PING: str = os.getenv("DB_POOL_PRE_PING", "idle").lower()
+    DB_POOL_PRE_PING_IDLE_SECONDS: float = float(os.getenv("DB_POOL_PRE_PING_IDLE_SECONDS", "30"))
+
+    # "development" or "production". Production never seeds sample data.
+    ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development").lower()
+
+    # Apply pending Alembic migrations during startup. Off by default so that
+    # schema changes only happen when explicitly requested.
+    AUTO_MIGRATE: bool = _env_bool("AUTO_MIGRATE", False)
+    # Insert the sample admin/teacher/parent data on startup (ignored in production).
+    SEED_ON_STARTUP: bool = _env_bool("SEED_ON_STARTUP", ENVIRONMENT != "production")
+
+    # Origins allowed by CORS (comma-separated)
+    CORS_ORIGINS: list[str] = [
+        origin.strip()
+        for origin in os.getenv("CORS_ORIGINS", "http://localhost:5173").split(",")
+        if origin.strip()
+    ]
+
+    # Where /upload/ stores files (relative to the working directory)
+    UPLOAD_DIR: str = os.getenv("UPLOAD_DIR", "uploads")
+
+    # Production server (app/server.py, gunicorn.conf.py)
+    HOST: str = os.getenv("HOST", "0.0.0.0")
+    PORT: int = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY: int = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+    SERVER_LOOP: str = os.getenv("SERVER_LOOP", "auto")  # "auto", "uvloop" or "asyncio"
+    SERVER_HTTP: str = os.getenv("SERVER_HTTP", "auto")  # "auto", "httptools" or "h11"
+    KEEPALIVE_TIMEOUT: int = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))  # seconds
+    GRACEFUL_TIMEOUT: int = int(os.getenv("GRACEFUL_TIMEOUT", "30"))  # seconds to drain in-flight requests
+
+    # Serve /announcements/for_parent from the parent_inbox table, which is filled
+    # when announcements are created. Run "python -m app.rebuild_parent_inbox"
+    # before turning this on, and after changing children outside the API.
+    PARENT_INBOX: bool = _env_bool("PARENT_INBOX", False)
+
+    # Delta sync (/announcements/for_parent/changes): the change log is kept this
+    # many days (python -m app.prune_announcement_changes)
+    ANNOUNCEMENT_CHANGES_RETENTION_DAYS: int = int(os.getenv("ANNOUNCEMENT_CHANGES_RETENTION_DAYS", "30"))
+
+    # How announcement events reach the SSE streams of every worker:
+    # "auto" (postgres on PostgreSQL, else memory), "postgres" (LISTEN/NOTIFY)
+    # or "memory" (this process only)
+    EVENT_BROKER: str = os.getenv("EVENT_BROKER", "auto").lower()
+    # Seconds between keep-alive comments on idle SSE streams
+    SSE_KEEPALIVE_SECONDS: float = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+    # Streams end after this long and the browser reconnects: it bounds graceful
+    # shutdown, spreads streams over the workers and refreshes the audience
+    # (e.g. a parent's classes)
+    SSE_STREAM_SECONDS: float = float(os.getenv("SSE_STREAM_SECONDS", "300"))
+    # Lifetime of the tickets that open a stream from the browser (POST
+    # /announcements/stream-ticket); they travel in the URL, and URLs are logged
+    SSE_TICKET_SECONDS: int = int(os.getenv("SSE_TICKET_SECONDS", "30"))
+
+    # Add an X-SQL-Queries header with the number of statements run per request
+    # (used by the benchmark suite; leave off in production)
+    SQL_QUERY_COUNT_HEADER: bool = _env_bool("SQL_QUERY_COUNT_HEADER", False)
+
     # If JWT_SECRET is not provided, generate one securely.
     jwt_secret_env = os.getenv("JWT_SECRET")
     if not jwt_secret_env or jwt_secret_env.strip() == "":
         # Generate a 43-character URL-safe secret (≈256 bits)
         jwt_secret_env = secrets.token_urlsafe(32)
-        
+
     JWT_SECRET: str = jwt_secret_env
     JWT_ALGORITHM: str = os.getenv("JWT_ALGORITHM", "HS256")
-    RATE_LIMIT: int = 5 # announcements per minute per user
+    # Verified access tokens remembered per worker (app/core/auth.py); 0 disables
+    TOKEN_CACHE_SIZE: int = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+    # Users loaded by get_current_user are reused for this many seconds per
+    # worker; role changes through the API invalidate them right away (0 disables)
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+    USER_CACHE_SIZE: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    RATE_LIMIT: int = int(os.getenv("RATE_LIMIT", "5"))  # announcements per window per user
+    RATE_LIMIT_WINDOW_SECONDS: float = float(os.getenv("RATE_LIMIT_WINDOW_SECONDS", "60"))
+    # Where rate limit counters live (app/utils/rate_limit.py): "sqlite" (a file
+    # shared by the workers of one host), "redis" (RATE_LIMIT_REDIS_URL, shared by
+    # several hosts) or "memory" (per worker process)
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "sqlite").lower()
+    RATE_LIMIT_SQLITE_PATH: str = os.getenv("RATE_LIMIT_SQLITE_PATH", "")  # default: in the temp directory
+    RATE_LIMIT_REDIS_URL: str = os.getenv("RATE_LIMIT_REDIS_URL", "")
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))  # memory backend
+    # Per-route throttling policies (app/utils/throttle.py); off for load tests
+    THROTTLE_ENABLED: bool = _env_bool("THROTTLE_ENABLED", True)
+    # Requests of all throttled routes together that one worker process handles at
+    # once; beyond it they get 503 (0 disables)
+    THROTTLE_MAX_IN_FLIGHT: int = int(os.getenv("THROTTLE_MAX_IN_FLIGHT", "64"))
+
+    # Password hashing pool per worker (app/core/security.py): threads hashing at
+    # once, and hashes that may wait for one before requests get a 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    PASSWORD_HASH_QUEUE_SIZE: int = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", "32"))
+    # "bcrypt" or "argon2" (argon2id, needs argon2-cffi) and its cost; choose them
+    # with "python -m app.calibrate_password_hash". Stored hashes with other
+    # parameters are rehashed at the next successful login.
+    PASSWORD_HASH_SCHEME: str = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt").lower()
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", "2"))
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", "19456"))  # KiB
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", "1"))
 
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_BASE_URL: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+    # AI client (app/core/llm.py), per worker: seconds to connect and to wait for
+    # the answer, retries of failed calls, and calls (= pooled connections) at once
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "5"))
+    LLM_READ_TIMEOUT: float = float(os.getenv("LLM_READ_TIMEOUT", "60"))
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "2"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+    # Cache of /ai/generate results (app/core/ai_cache.py): per worker in memory
+    # (0 disables), and optionally in a SQLite file kept across restarts
+    AI_CACHE_SIZE: int = int(os.getenv("AI_CACHE_SIZE", "1000"))
+    AI_CACHE_TTL_SECONDS: float = float(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+    AI_CACHE_SQLITE_PATH: str = os.getenv("AI_CACHE_SQLITE_PATH", "")  # empty: memory only
+    AI_CACHE_DISK_TTL_SECONDS: float = float(os.getenv("AI_CACHE_DISK_TTL_SECONDS", str(7 * 24 * 3600)))
+
+    @property
+    def is_production(self) -> bool:
+        return self.ENVIRONMENT == "production"
 
 
 settings = Settings()
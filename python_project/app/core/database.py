@@ -1,16 +1,222 @@
 # filename: app/core/database.py
-from sqlalchemy import create_engine
+import hashlib
+import itertools
+import os
+from contextvars import ContextVar
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import settings
+from app.core.config import Settings, settings
+from app.core.db_pool import pool_options, instrument_pool
+from app.core.metrics import register_metrics
+from app.utils import rate_limit
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Engines are created lazily, once per process (see init_engine / init_async_engine),
+# so that a pre-forking server never hands the same pooled connections to several
+# workers.
+#
+# Request handlers use the async engines through get_db (primary) and get_read_db
+# (replicas, if configured). The sync engine is only used by startup tasks and
+# scripts (migrations, seeding, dataset generation).
+_engine: Engine | None = None
+_async_engine: AsyncEngine | None = None
+_replica_engines: list[AsyncEngine] = []
+_replica_cycle = None
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+# expire_on_commit=False: attributes stay readable after commit without another
+# round-trip (an AsyncSession cannot lazy load them).
+AsyncSessionLocal = async_sessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+# Sync driver -> async driver used for the request-serving engines
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
+
+
+def to_async_url(url: str) -> str:
+    """Swap a sync driver in a database URL for its async counterpart."""
+    parsed = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed.drivername, parsed.drivername)
+    return parsed.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def async_database_url(app_settings: Settings = settings) -> str:
+    """ASYNC_DATABASE_URL if set, otherwise DATABASE_URL with an async driver."""
+    return app_settings.ASYNC_DATABASE_URL or to_async_url(app_settings.SQLALCHEMY_DATABASE_URI)
+
+
+def init_engine(app_settings: Settings = settings) -> Engine:
+    """Create this process' sync engine (idempotent) and bind SessionLocal to it."""
+    global _engine
+    if _engine is None:
+        _engine = create_engine(app_settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
+        SessionLocal.configure(bind=_engine)
+    return _engine
+
+
+def init_async_engine(app_settings: Settings = settings) -> AsyncEngine:
+    """
+    Create this process' async engines (idempotent): the primary, bound to
+    AsyncSessionLocal, plus one per DATABASE_REPLICA_URLS entry.
+    """
+    global _async_engine, _replica_cycle
+    if _async_engine is None:
+        url = async_database_url(app_settings)
+        _async_engine = create_async_engine(url, **pool_options(url, app_settings))
+        instrument_pool(_async_engine, "primary", app_settings)
+        AsyncSessionLocal.configure(bind=_async_engine)
+
+        for i, replica_url in enumerate(app_settings.DATABASE_REPLICA_URLS):
+            replica_url = to_async_url(replica_url)
+            replica = create_async_engine(replica_url, **pool_options(replica_url, app_settings))
+            instrument_pool(replica, f"replica_{i}", app_settings)
+            _replica_engines.append(replica)
+        _replica_cycle = itertools.cycle(_replica_engines) if _replica_engines else None
+    return _async_engine
+
+
+def get_engine() -> Engine:
+    return init_engine()
+
+
+def async_engines() -> list[AsyncEngine]:
+    """The primary and replica async engines of this process."""
+    return ([_async_engine] if _async_engine is not None else []) + _replica_engines
+
+
+def dispose_engine() -> None:
+    """Close every pooled connection of the sync engine."""
+    global _engine
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+async def dispose_async_engine() -> None:
+    """Close every pooled connection of the async engines; called on worker shutdown."""
+    global _async_engine, _replica_cycle
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+    for replica in _replica_engines:
+        await replica.dispose()
+    _replica_engines.clear()
+    _replica_cycle = None
+
+
+def _discard_inherited_pool() -> None:
+    # Runs in a freshly forked child: drop the parent's pooled connections without
+    # closing them (the parent still owns those sockets); new ones open on demand.
+    if _engine is not None:
+        _engine.dispose(close=False)
+    for async_engine in async_engines():
+        async_engine.sync_engine.dispose(close=False)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_discard_inherited_pool)
+
+
+# Read-your-writes: after a client commits a write, its reads go to the primary
+# for REPLICA_READ_AFTER_WRITE_SECONDS so it never sees replication lag on its own
+# changes. Clients are identified by their Authorization header.
+#
+# The next request of the client may reach any worker, so the pins are markers in
+# the rate limiter's store (app/utils/rate_limit.py): shared by the workers of a
+# host with RATE_LIMIT_BACKEND=sqlite, by several hosts with redis, and only
+# reliable with a single worker with memory. ReadYourWritesMiddleware records the
+# pin before the response of the write starts, so it is in place by the time the
+# client can send its next request. If the store fails, reads go to the primary.
+_routing = {"replica": 0, "primary_no_replica": 0, "primary_pinned": 0, "pin_errors": 0}
+register_metrics("db_routing", lambda: dict(_routing))
+
+# Clients that committed during the current request, per request (see the middleware)
+_committed_clients: ContextVar[list[str] | None] = ContextVar("committed_clients", default=None)
+
+
+def _client_key(request: Request) -> str | None:
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+async def _pin_to_primary(key: str) -> None:
     try:
+        await rate_limit.mark(f"primary:{key}", settings.REPLICA_READ_AFTER_WRITE_SECONDS)
+    except Exception as exc:
+        _routing["pin_errors"] += 1
+        print(f"Could not pin reads to the primary: {exc}")
+
+
+async def _is_pinned(key: str | None) -> bool:
+    if key is None:
+        return False
+    try:
+        return await rate_limit.is_marked(f"primary:{key}")
+    except Exception as exc:
+        _routing["pin_errors"] += 1
+        print(f"Could not check the primary pin: {exc}")
+        return True  # the primary is always up to date
+
+
+class ReadYourWritesMiddleware:
+    """Pins the reads of a client that committed through get_db, before the response starts."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        committed: list[str] = []
+        token = _committed_clients.set(committed)
+
+        async def send_after_pin(message):
+            if message["type"] == "http.response.start":
+                for key in set(committed):
+                    await _pin_to_primary(key)
+                committed.clear()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_after_pin)
+        finally:
+            _committed_clients.reset(token)
+
+
+async def get_db(request: Request):
+    """Session on the primary. Committing through it pins the client's reads to the primary."""
+    async with AsyncSessionLocal() as db:
+        key = _client_key(request)
+        committed = _committed_clients.get()
+        if key is not None and committed is not None and _replica_engines:
+            event.listen(db.sync_session, "after_commit", lambda session: committed.append(key))
+        yield db
+
+
+async def get_read_db(request: Request):
+    """
+    Session for read-only handlers: a replica (round-robin) when configured,
+    the primary when there are none or the client wrote recently.
+    """
+    if _replica_cycle is None:
+        _routing["primary_no_replica"] += 1
+        bind = None
+    elif await _is_pinned(_client_key(request)):
+        _routing["primary_pinned"] += 1
+        bind = None
+    else:
+        _routing["replica"] += 1
+        bind = next(_replica_cycle)
+    async with (AsyncSessionLocal(bind=bind) if bind is not None else AsyncSessionLocal()) as db:
         yield db
-    finally:
-        db.close()
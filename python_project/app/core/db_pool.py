@@ -0,0 +1,140 @@
+# filename: app/core/db_pool.py
+"""
+Connection pool configuration and instrumentation for the request-serving engine.
+
+Pool sizing comes from settings (DB_POOL_*). Pre-ping strategies:
+  "always" - ping on every checkout (SQLAlchemy's pool_pre_ping)
+  "idle"   - ping only connections idle for more than DB_POOL_PRE_PING_IDLE_SECONDS
+  "never"  - no ping; rely on DB_POOL_RECYCLE and error handling
+"""
+import time
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from app.core.config import Settings
+from app.core.metrics import LatencyWindow, register_metrics
+
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.wait = LatencyWindow()
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.pings = 0
+        self.ping_failures = 0
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited and counts checkout timeouts."""
+
+    metrics: PoolMetrics | None = None
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        if self.metrics is not None:
+            self.metrics.wait.observe(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same metrics
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def pool_options(url: str, app_settings: Settings) -> dict:
+    """Keyword arguments for create_async_engine."""
+    strategy = app_settings.DB_POOL_PRE_PING
+    if strategy not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_POOL_PRE_PING must be one of {', '.join(PRE_PING_STRATEGIES)}, got {strategy!r}")
+    options = {"pool_pre_ping": strategy == "always"}
+    if make_url(url).get_backend_name() == "sqlite":
+        # SQLite uses its own pool implementations without sizing options
+        return options
+    options.update(
+        poolclass=InstrumentedAsyncAdaptedQueuePool,
+        pool_size=app_settings.DB_POOL_SIZE,
+        max_overflow=app_settings.DB_MAX_OVERFLOW,
+        pool_timeout=app_settings.DB_POOL_TIMEOUT,
+        pool_recycle=app_settings.DB_POOL_RECYCLE,
+    )
+    return options
+
+
+def instrument_pool(engine, name: str, app_settings: Settings) -> PoolMetrics:
+    """
+    Attach metrics (and the "idle" pre-ping strategy) to an engine's pool and
+    register the snapshot under "db_pool.<name>". Accepts a sync or async engine.
+    """
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pool = sync_engine.pool
+    metrics = PoolMetrics()
+    if isinstance(pool, InstrumentedAsyncAdaptedQueuePool):
+        pool.metrics = metrics
+    # Listeners survive engine.dispose() (the replacement pool shares the dispatcher)
+
+    @event.listens_for(pool, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        metrics.connects += 1
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        connection_record.info["checked_in_at"] = time.monotonic()
+
+    @event.listens_for(pool, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        metrics.invalidations += 1
+
+    if app_settings.DB_POOL_PRE_PING == "idle":
+        idle_seconds = app_settings.DB_POOL_PRE_PING_IDLE_SECONDS
+
+        @event.listens_for(pool, "checkout")
+        def ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+            checked_in_at = connection_record.info.get("checked_in_at")
+            if checked_in_at is None or time.monotonic() - checked_in_at < idle_seconds:
+                return
+            metrics.pings += 1
+            try:
+                alive = sync_engine.dialect.do_ping(dbapi_connection)
+            except Exception:
+                alive = False
+            if not alive:
+                metrics.ping_failures += 1
+                # Makes the pool discard this connection and retry with a fresh one
+                raise exc.DisconnectionError("connection failed pre-ping after being idle")
+
+    def snapshot() -> dict:
+        pool = sync_engine.pool  # may have been replaced by dispose()
+        data = {
+            "pool": type(pool).__name__,
+            "connects": metrics.connects,
+            "invalidations": metrics.invalidations,
+            "checkout_timeouts": metrics.timeouts,
+            "pre_ping": app_settings.DB_POOL_PRE_PING,
+            "pings": metrics.pings,
+            "ping_failures": metrics.ping_failures,
+            "checkout_wait": metrics.wait.summary(),
+        }
+        if hasattr(pool, "checkedout"):
+            data.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=max(0, pool.overflow()),
+                max_overflow=app_settings.DB_MAX_OVERFLOW,
+                timeout=pool.timeout(),
+            )
+        return data
+
+    register_metrics(f"db_pool.{name}", snapshot)
+    return metrics
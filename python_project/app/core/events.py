@@ -0,0 +1,205 @@
+# filename: app/core/events.py
+"""
+Announcement events (created / updated / deleted) for the SSE stream.
+
+Write paths call publish() after they commit; every worker delivers the event
+to the streams of its own subscribers, which filter it by audience (see
+routers/announcements.py). How events travel between workers is pluggable
+(EVENT_BROKER):
+
+- "memory": within this process only. For tests, development and single-worker
+  deployments.
+- "postgres": PostgreSQL LISTEN/NOTIFY on one dedicated asyncpg connection per
+  worker, so an event published by any worker reaches every worker.
+- "auto" (default): "postgres" on PostgreSQL, "memory" otherwise.
+
+Events carry ids only (announcement, author, classes, parents) and clients
+reload what they display. "parents": null means "possibly any parent"; it
+replaces parent lists too long for a NOTIFY payload.
+"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+from sqlalchemy.engine import make_url
+
+from app.core.config import Settings, settings
+from app.core.metrics import register_metrics
+
+CHANNEL = "announcement_events"
+# NOTIFY payloads must stay below 8000 bytes
+MAX_PAYLOAD_BYTES = 7900
+# Events a slow stream may fall behind by before it is closed; the client
+# reconnects and reloads its feed.
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_stats = {"published": 0, "delivered": 0, "dropped_subscribers": 0}
+
+
+class MemoryBroker:
+    """Fans events out to this process' subscribers."""
+
+    def __init__(self):
+        self._subscribers: set[asyncio.Queue] = set()
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        for queue in list(self._subscribers):
+            self._close(queue)
+
+    async def publish(self, event: dict) -> None:
+        _stats["published"] += 1
+        self._deliver(event)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """An asyncio.Queue of events; None means the stream must end."""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE + 1)  # + room for the None
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _deliver(self, event: dict) -> None:
+        for queue in list(self._subscribers):
+            if queue.qsize() >= SUBSCRIBER_QUEUE_SIZE:
+                _stats["dropped_subscribers"] += 1
+                self._close(queue)
+                continue
+            queue.put_nowait(event)
+            _stats["delivered"] += 1
+
+    def _close(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+class PostgresBroker(MemoryBroker):
+    """
+    Publishes with pg_notify and listens on CHANNEL. The listening connection is
+    reopened when it drops; events sent while it was down are lost, which
+    clients cover by reloading their feed when the stream reconnects.
+    """
+
+    RECONNECT_SECONDS = 5
+
+    def __init__(self, url: str):
+        super().__init__()
+        # asyncpg takes a plain postgresql:// DSN
+        self._dsn = make_url(url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self._connection = None
+        self._lock = asyncio.Lock()  # one operation at a time on the connection
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        await self._connect()
+        self._task = asyncio.create_task(self._keep_connected())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._connection is not None and not self._connection.is_closed():
+            await self._connection.close()
+        await super().stop()
+
+    async def publish(self, event: dict) -> None:
+        _stats["published"] += 1
+        payload = json.dumps(event)
+        if len(payload.encode()) > MAX_PAYLOAD_BYTES:
+            payload = json.dumps({**event, "parents": None})
+        # Delivered to this worker's subscribers through its own listener too
+        async with self._lock:
+            if self._connection is None or self._connection.is_closed():
+                await self._connect()
+            await self._connection.execute("SELECT pg_notify($1, $2)", CHANNEL, payload)
+
+    async def _connect(self) -> None:
+        import asyncpg
+
+        self._connection = await asyncpg.connect(self._dsn)
+        await self._connection.add_listener(CHANNEL, self._on_notify)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._deliver(json.loads(payload))
+
+    async def _keep_connected(self) -> None:
+        while True:
+            await asyncio.sleep(self.RECONNECT_SECONDS)
+            if self._connection is not None and not self._connection.is_closed():
+                continue
+            try:
+                async with self._lock:
+                    await self._connect()
+                print("Announcement event listener reconnected.")
+            except Exception as exc:
+                print(f"Announcement event listener could not reconnect: {exc}")
+
+
+_broker: MemoryBroker | None = None
+
+
+def create_broker(app_settings: Settings = settings) -> MemoryBroker:
+    kind = app_settings.EVENT_BROKER
+    if kind == "auto":
+        is_postgres = make_url(app_settings.SQLALCHEMY_DATABASE_URI).get_backend_name() == "postgresql"
+        kind = "postgres" if is_postgres else "memory"
+    if kind == "postgres":
+        from app.core.database import async_database_url
+
+        return PostgresBroker(async_database_url(app_settings))
+    if kind == "memory":
+        return MemoryBroker()
+    raise ValueError(f"Unknown EVENT_BROKER {kind!r} (expected auto, memory or postgres)")
+
+
+async def start_broker(app_settings: Settings = settings) -> MemoryBroker:
+    """Create and start this process' broker; called from the lifespan hook."""
+    global _broker
+    if _broker is None:
+        broker = create_broker(app_settings)
+        await broker.start()
+        _broker = broker
+    return _broker
+
+
+async def stop_broker() -> None:
+    global _broker
+    if _broker is not None:
+        await _broker.stop()
+        _broker = None
+
+
+def get_broker() -> MemoryBroker:
+    if _broker is None:
+        raise RuntimeError("The event broker is not started")
+    return _broker
+
+
+async def publish(event_type: str, announcement_id: int, created_by_id: int,
+                  classes: list[int], parents: list[int]) -> None:
+    """
+    Tell the streams about an announcement change. Call it after the commit; a
+    failed publish is logged, not raised, because the change itself succeeded.
+    """
+    if _broker is None:
+        return
+    event = {"type": event_type, "id": announcement_id, "created_by_id": created_by_id,
+             "classes": classes, "parents": parents}
+    try:
+        await _broker.publish(event)
+    except Exception as exc:
+        print(f"Could not publish announcement event {event_type} {announcement_id}: {exc}")
+
+
+register_metrics("announcement_events", lambda: {
+    **_stats, "subscribers": _broker.subscriber_count() if _broker is not None else 0,
+})
@@ -0,0 +1,227 @@
+# filename: app/core/llm.py
+"""
+Async client for the OpenAI chat completions API, used by routers/ai.py.
+
+One httpx.AsyncClient per worker process keeps a pool of connections to the
+API, so requests reuse TLS connections instead of each opening its own. Calls
+never block a thread: a generation that takes seconds only holds a slot of the
+LLM_MAX_CONCURRENCY semaphore (callers beyond it wait for a slot) and one
+pooled connection.
+
+Each call has connect/read timeouts (LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT).
+Connection failures, 429 and 5xx answers are retried up to LLM_MAX_RETRIES
+times with jittered exponential backoff (or the API's Retry-After). Read
+timeouts are not retried: the model may still be working on the request, and
+retrying would double the wait. Failures raise LLMError.
+
+stream_chat_completion() yields the completion piece by piece as the model
+produces it (retries only happen before the first piece). Closing it early,
+as Starlette does when the client disconnects, closes the upstream connection,
+which stops the generation and its token usage.
+"""
+import asyncio
+import json
+import random
+import time
+from typing import AsyncIterator
+
+import httpx
+
+from app.core.config import Settings, settings
+from app.core.metrics import LatencyWindow, register_metrics
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+
+
+class LLMError(Exception):
+    """A failed completion. status_code is the HTTP status the API should answer with."""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+_client: httpx.AsyncClient | None = None
+_semaphore: asyncio.Semaphore | None = None
+_latency = LatencyWindow()
+_first_piece_latency = LatencyWindow()  # streams only
+_stats = {"requests": 0, "streams": 0, "retries": 0, "errors": 0, "cancelled": 0, "in_flight": 0}
+
+
+def create_client(app_settings: Settings = settings) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=app_settings.OPENAI_BASE_URL,
+        headers={"Authorization": f"Bearer {app_settings.OPENAI_API_KEY}"},
+        timeout=httpx.Timeout(
+            app_settings.LLM_READ_TIMEOUT, connect=app_settings.LLM_CONNECT_TIMEOUT,
+        ),
+        limits=httpx.Limits(
+            max_connections=app_settings.LLM_MAX_CONCURRENCY,
+            max_keepalive_connections=app_settings.LLM_MAX_CONCURRENCY,
+        ),
+    )
+
+
+def _get_client() -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+    # Created on first use, in the worker process and on its event loop
+    global _client, _semaphore
+    if _client is None:
+        _client = create_client()
+        _semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+    return _client, _semaphore
+
+
+async def close_client() -> None:
+    """Close the connection pool; called from the lifespan hook."""
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        _semaphore = None
+
+
+def _backoff(attempt: int, response: httpx.Response | None) -> float:
+    """Seconds to wait before retry number attempt (1-based)."""
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after and retry_after.replace(".", "", 1).isdigit():
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+    # "Full jitter": spreads the retries of many callers hit by the same outage
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def _error_detail(response: httpx.Response) -> str:
+    try:
+        return response.json()["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return response.text[:200]
+
+
+async def _send(client: httpx.AsyncClient, payload: dict, stream: bool = False) -> httpx.Response:
+    """
+    POST /chat/completions with retries; a successful response. With stream=True
+    its body is not read yet, and the caller must close it.
+    """
+    request = client.build_request("POST", "/chat/completions", json=payload)
+    for attempt in range(settings.LLM_MAX_RETRIES + 1):
+        response = None
+        try:
+            response = await client.send(request, stream=stream)
+        except httpx.ReadTimeout:
+            raise LLMError("The AI service did not answer in time", status_code=504)
+        except httpx.TransportError as exc:
+            if attempt == settings.LLM_MAX_RETRIES:
+                raise LLMError(f"Could not reach the AI service: {exc!r}")
+        else:
+            if response.status_code < 400:
+                return response
+            if stream:
+                await response.aread()
+                await response.aclose()
+            if response.status_code not in RETRY_STATUS_CODES or attempt == settings.LLM_MAX_RETRIES:
+                raise LLMError(f"AI service error {response.status_code}: {_error_detail(response)}")
+        _stats["retries"] += 1
+        await asyncio.sleep(_backoff(attempt + 1, response))
+    raise AssertionError("unreachable")
+
+
+def _payload(messages: list[dict], max_tokens: int, temperature: float, model: str | None) -> dict:
+    if not settings.OPENAI_API_KEY:
+        raise LLMError("OpenAI API key not configured", status_code=500)
+    return {
+        "model": model or settings.OPENAI_MODEL,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+    }
+
+
+async def chat_completion(messages: list[dict], *, max_tokens: int, temperature: float = 0.7,
+                          model: str | None = None) -> str:
+    """The text of one chat completion for messages ([{"role": ..., "content": ...}])."""
+    payload = _payload(messages, max_tokens, temperature, model)
+    client, semaphore = _get_client()
+    _stats["requests"] += 1
+    async with semaphore:
+        _stats["in_flight"] += 1
+        started = time.perf_counter()
+        try:
+            body = (await _send(client, payload)).json()
+        except LLMError:
+            _stats["errors"] += 1
+            raise
+        finally:
+            _stats["in_flight"] -= 1
+            _latency.observe(time.perf_counter() - started)
+    try:
+        return body["choices"][0]["message"]["content"]
+    except (KeyError, IndexError, TypeError):
+        _stats["errors"] += 1
+        raise LLMError("Unexpected response from the AI service")
+
+
+def _stream_piece(line: str) -> str | None:
+    """The text in one line of a completion stream ("data: {...}"); None at the end."""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    try:
+        chunk = json.loads(data)
+    except ValueError:
+        raise LLMError("Unexpected response from the AI service")
+    if "error" in chunk:
+        raise LLMError(f"AI service error: {chunk['error'].get('message', chunk['error'])}")
+    choices = chunk.get("choices") or []  # some chunks carry no choice
+    return ((choices[0].get("delta") or {}).get("content") or "") if choices else ""
+
+
+async def stream_chat_completion(messages: list[dict], *, max_tokens: int, temperature: float = 0.7,
+                                 model: str | None = None) -> AsyncIterator[str]:
+    """Like chat_completion(), but yields the text in pieces as the model produces them."""
+    payload = {**_payload(messages, max_tokens, temperature, model), "stream": True}
+    client, semaphore = _get_client()
+    _stats["requests"] += 1
+    _stats["streams"] += 1
+    async with semaphore:
+        _stats["in_flight"] += 1
+        started = time.perf_counter()
+        first = True
+        try:
+            response = await _send(client, payload, stream=True)
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue  # blank separators and comments
+                    piece = _stream_piece(line)
+                    if piece is None:
+                        break
+                    if piece:
+                        if first:
+                            _first_piece_latency.observe(time.perf_counter() - started)
+                            first = False
+                        yield piece
+            except httpx.ReadTimeout:
+                raise LLMError("The AI service stopped answering", status_code=504)
+            except httpx.TransportError as exc:
+                raise LLMError(f"The AI service closed the stream: {exc!r}")
+            finally:
+                await response.aclose()
+        except LLMError:
+            _stats["errors"] += 1
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            _stats["cancelled"] += 1
+            raise
+        finally:
+            _stats["in_flight"] -= 1
+            _latency.observe(time.perf_counter() - started)
+
+
+register_metrics("llm", lambda: {
+    **_stats,
+    "max_concurrency": settings.LLM_MAX_CONCURRENCY,
+    "latency": _latency.summary(),
+    "stream_first_piece": _first_piece_latency.summary(),
+})
@@ -0,0 +1,55 @@
+# filename: app/core/metrics.py
+"""
+Minimal in-process metrics registry. Components register a callable returning a
+JSON-serialisable snapshot; GET /admin/metrics returns all of them. Values are
+per worker process.
+"""
+from collections import deque
+from typing import Callable
+
+_collectors: dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, collector: Callable[[], dict]) -> None:
+    _collectors[name] = collector
+
+
+def unregister_metrics(name: str) -> None:
+    _collectors.pop(name, None)
+
+
+def collect_metrics() -> dict:
+    return {name: collector() for name, collector in _collectors.items()}
+
+
+class LatencyWindow:
+    """Keeps the most recent samples (seconds) and summarises them in milliseconds."""
+
+    def __init__(self, size: int = 1024):
+        self.samples: deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self) -> dict:
+        recent = sorted(self.samples)
+
+        def pct(fraction):
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(fraction * len(recent)))] * 1000, 3)
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else None,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max * 1000, 3),
+        }
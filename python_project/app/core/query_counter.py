@@ -0,0 +1,51 @@
+# filename: app/core/query_counter.py
+"""
+Counts the SQL statements executed while handling each request and reports the
+number in an X-SQL-Queries response header. Enabled with SQL_QUERY_COUNT_HEADER;
+used by the benchmark suite to catch N+1 regressions.
+"""
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+HEADER_NAME = b"x-sql-queries"
+
+# Holds a one-element list so that the threadpool (which runs handlers in a copy
+# of the request's context) increments the same counter.
+_request_counter: ContextVar[list[int] | None] = ContextVar("sql_query_counter", default=None)
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _request_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def install_query_counter(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _count_statement):
+        event.listen(engine, "before_cursor_execute", _count_statement)
+
+
+class QueryCountMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        counter = [0]
+        token = _request_counter.set(counter)
+
+        async def send_with_count(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((HEADER_NAME, str(counter[0]).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _request_counter.reset(token)
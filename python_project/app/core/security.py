@@ -1,10 +1,141 @@
 # filename: app/core/security.py
+"""
+Password hashing.
+
+The scheme and its cost come from the settings (PASSWORD_HASH_SCHEME: bcrypt
+with BCRYPT_ROUNDS, or argon2id with ARGON2_*; pick them with
+"python -m app.calibrate_password_hash"). Hashes made with another scheme or
+other parameters still verify and are flagged for rehashing, which login does
+through verify_and_update_password_async().
+
+hash_password() and verify_password() are synchronous, for scripts. Request
+handlers await the *_async() variants instead, which run the hashing on a small
+dedicated thread pool (bcrypt and argon2 release the GIL while they hash). The
+pool is separate from Starlette's threadpool, so a burst of logins cannot
+starve the other endpoints, and it takes at most
+PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE hashes at a time. Beyond that
+callers get an immediate 503 instead of waiting in an unbounded queue.
+Hash and queue times are reported under "password_hashing" in /admin/metrics.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.config import Settings, settings
+from app.core.metrics import LatencyWindow, register_metrics
+
+PASSWORD_HASH_SCHEMES = ("bcrypt", "argon2")
+
+
+def build_password_context(app_settings: Settings = settings) -> CryptContext:
+    """
+    A context hashing with the configured scheme and cost. Both schemes stay
+    verifiable; hashes of the other scheme, or with another cost, need an update.
+    """
+    scheme = app_settings.PASSWORD_HASH_SCHEME
+    if scheme not in PASSWORD_HASH_SCHEMES:
+        raise ValueError(f"Unknown PASSWORD_HASH_SCHEME {scheme!r} (expected bcrypt or argon2)")
+    if scheme == "argon2":
+        from passlib.hash import argon2
+
+        if not argon2.has_backend():
+            raise RuntimeError("PASSWORD_HASH_SCHEME=argon2 needs the argon2-cffi package (pip install argon2-cffi)")
+    rounds = app_settings.BCRYPT_ROUNDS
+    time_cost = app_settings.ARGON2_TIME_COST
+    return CryptContext(
+        schemes=[scheme] + [other for other in PASSWORD_HASH_SCHEMES if other != scheme],
+        deprecated="auto",
+        # min = max = default, so that any other cost counts as outdated
+        bcrypt__rounds=rounds, bcrypt__min_rounds=rounds, bcrypt__max_rounds=rounds,
+        argon2__type="ID",
+        argon2__rounds=time_cost, argon2__min_rounds=time_cost, argon2__max_rounds=time_cost,
+        argon2__memory_cost=app_settings.ARGON2_MEMORY_COST,
+        argon2__parallelism=app_settings.ARGON2_PARALLELISM,
+    )
+
+
+pwd_context = build_password_context()
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain: str, hashed: str) -> bool:
     return pwd_context.verify(plain, hashed)
+
+def verify_and_update_password(plain: str, hashed: str) -> tuple[bool, str | None]:
+    """(valid, new hash); the new hash is set when the stored one uses outdated parameters."""
+    return pwd_context.verify_and_update(plain, hashed)
+
+
+_executor: ThreadPoolExecutor | None = None
+_in_flight = 0  # queued + running; only changed on the event loop
+_hash_latency = LatencyWindow()
+_queue_latency = LatencyWindow()
+_stats = {"rejected": 0}
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Created on first use, i.e. in the worker process after any fork
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+        )
+    return _executor
+
+
+def shutdown_hash_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def _run_hashing(fn, *args):
+    global _in_flight
+    if _in_flight >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE_SIZE:
+        _stats["rejected"] += 1
+        raise HTTPException(
+            status_code=503, detail="Server busy, please try again", headers={"Retry-After": "1"}
+        )
+
+    def timed():
+        started = time.perf_counter()
+        return fn(*args), started, time.perf_counter()
+
+    _in_flight += 1
+    submitted = time.perf_counter()
+    try:
+        result, started, finished = await asyncio.get_running_loop().run_in_executor(_get_executor(), timed)
+    finally:
+        _in_flight -= 1
+    # Recorded here, on the event loop, rather than in the pool's threads
+    _queue_latency.observe(started - submitted)
+    _hash_latency.observe(finished - started)
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(hash_password, password)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _run_hashing(verify_password, plain, hashed)
+
+
+async def verify_and_update_password_async(plain: str, hashed: str) -> tuple[bool, str | None]:
+    return await _run_hashing(verify_and_update_password, plain, hashed)
+
+
+register_metrics("password_hashing", lambda: {
+    "scheme": settings.PASSWORD_HASH_SCHEME,
+    "workers": settings.PASSWORD_HASH_WORKERS,
+    "queue_size": settings.PASSWORD_HASH_QUEUE_SIZE,
+    "in_flight": _in_flight,
+    **_stats,
+    "hash": _hash_latency.summary(),
+    "queue_wait": _queue_latency.summary(),
+})
@@ -0,0 +1,159 @@
+# filename: app/core/startup.py
+import hashlib
+import os
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import Settings, settings
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+# Arbitrary constant shared by every worker; whoever holds the lock runs the DDL.
+MIGRATION_LOCK_ID = 72_201_512
+
+# Set by the pre-fork entry points (app/server.py, gunicorn.conf.py) once they have
+# migrated and seeded; inherited by the workers, which then only check the revision.
+DATABASE_PREPARED_ENV = "KLASSTRA_DATABASE_PREPARED"
+
+
+class SchemaOutOfDateError(RuntimeError):
+    pass
+
+
+def get_alembic_config() -> Config:
+    """Alembic config that works regardless of the current working directory."""
+    config = Config(os.path.join(PROJECT_ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(PROJECT_ROOT, "migrations"))
+    return config
+
+
+@lru_cache(maxsize=1)
+def get_head_revision() -> str:
+    """Head revision read from the migration scripts on disk (no database access)."""
+    return ScriptDirectory.from_config(get_alembic_config()).get_current_head()
+
+
+def get_current_revision(connection: Connection) -> str | None:
+    """Revision stamped in the database, or None if Alembic never ran against it."""
+    try:
+        return connection.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except DBAPIError:
+        # alembic_version does not exist yet
+        return None
+    finally:
+        # Read-only check: end the implicit transaction so Alembic can manage its own.
+        connection.rollback()
+
+
+@contextmanager
+def startup_lock(engine: Engine):
+    """
+    Serialises startup tasks (migrations, seeding) between processes: a PostgreSQL
+    advisory lock, or for other databases an exclusive lock on a file in the temp
+    directory (POSIX only; elsewhere there is no lock).
+    """
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(text("SELECT pg_advisory_lock(:id)"), {"id": MIGRATION_LOCK_ID})
+            connection.commit()
+            try:
+                yield
+            finally:
+                connection.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": MIGRATION_LOCK_ID})
+                connection.commit()
+        return
+
+    try:
+        import fcntl
+    except ImportError:
+        yield
+        return
+    url = engine.url.render_as_string(hide_password=True)
+    path = os.path.join(tempfile.gettempdir(), f"klasstra-startup-{hashlib.sha256(url.encode()).hexdigest()[:16]}.lock")
+    with open(path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def upgrade_to_head(engine: Engine) -> None:
+    """
+    Apply pending migrations. The startup lock serialises concurrent callers, so
+    when several workers start at once only one of them runs the DDL and the
+    others find the schema already at head once they get the lock.
+    """
+    head = get_head_revision()
+    with startup_lock(engine), engine.connect() as connection:
+        if get_current_revision(connection) == head:
+            return
+        config = get_alembic_config()
+        config.attributes["connection"] = connection
+        command.upgrade(config, "head")
+        connection.commit()
+
+
+def seed_database(engine: Engine, app_settings: Settings = settings) -> None:
+    """
+    Insert the sample data. seed() only adds what is missing; under the startup
+    lock, processes starting together run it one after the other, and all but the
+    first find everything in place.
+    """
+    from app.seed import seed
+
+    with startup_lock(engine):
+        print("Seeding the database with sample data...")
+        seed(app_settings)
+        print("Database seeding complete.")
+
+
+def mark_database_prepared() -> None:
+    """Tell the workers about to be started that the database is migrated and seeded."""
+    os.environ[DATABASE_PREPARED_ENV] = "1"
+
+
+def share_jwt_secret(app_settings: Settings = settings) -> None:
+    """
+    Hand the JWT secret to the workers about to be started. Without JWT_SECRET the
+    config makes one up at import time, and spawned workers import it again: each
+    would sign and check tokens with its own secret and reject the others' tokens.
+    """
+    if not os.getenv("JWT_SECRET", "").strip():
+        print("JWT_SECRET is not set: using a random secret, tokens will not survive a restart.")
+        os.environ["JWT_SECRET"] = app_settings.JWT_SECRET
+
+
+def prepare_database(engine: Engine, app_settings: Settings = settings) -> None:
+    """
+    Startup check run once per worker. Costs a single query when the schema is
+    already at head; migrations and seeding only happen when enabled in settings,
+    and not in workers of a pre-fork entry point that already did them.
+    """
+    prepared = os.environ.get(DATABASE_PREPARED_ENV) == "1"
+    head = get_head_revision()
+    with engine.connect() as connection:
+        current = get_current_revision(connection)
+
+    if current != head:
+        if not app_settings.AUTO_MIGRATE or prepared:
+            raise SchemaOutOfDateError(
+                f"Database schema is at revision {current!r}, expected {head!r}. "
+                "Run 'alembic upgrade head' (or set AUTO_MIGRATE=true) before starting the app. "
+                "Databases created by the old create_all() startup can be adopted with "
+                "'alembic stamp da11abc7f593 && alembic upgrade head'."
+            )
+        print(f"Migrating database schema from {current!r} to {head!r}...")
+        upgrade_to_head(engine)
+        print("Database schema is up to date.")
+
+    if app_settings.SEED_ON_STARTUP and not app_settings.is_production and not prepared:
+        seed_database(engine, app_settings)
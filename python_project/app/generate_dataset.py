@@ -0,0 +1,243 @@
+# filename: app/generate_dataset.py
+"""
+Bulk generator for production-sized test data.
+
+    cd python_project
+    python -m app.generate_dataset --classes 200 --parents 20000 --children 40000 --announcements 2000000
+
+Rows are written with COPY on PostgreSQL and batched multi-row INSERTs elsewhere.
+Every generated user shares one precomputed password hash (password: see
+--password), so loading is dominated by the database, not by bcrypt. Ids are
+assigned up front (after the current max id), which keeps foreign keys cheap to
+generate and lets the data be appended to a database that already has rows.
+"""
+import sys
+import os
+
+# Add the project root to sys.path to allow imports from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import func, select, text
+
+from app.core.database import init_engine
+from app.core.security import hash_password
+from app.models.user import User
+from app.models.class_ import Class
+from app.models.child import Child
+from app.models.announcement import Announcement
+from app.models.announcement_recipient import AnnouncementRecipient
+from app.models.teacher_class import TeacherClass
+
+FIRST_NAMES = ["Alice", "Bob", "Chloé", "David", "Emma", "Felix", "Greta", "Hugo", "Inès", "Jonas",
+               "Klara", "Lukas", "Mia", "Noah", "Olivia", "Paul", "Rosa", "Simon", "Théo", "Zoé"]
+LAST_NAMES = ["Smith", "Müller", "Martin", "Bernard", "Schmidt", "Dubois", "Weber", "Moreau",
+              "Fischer", "Laurent", "Meyer", "Girard", "Wagner", "Roux", "Becker", "Fontaine"]
+TITLES = ["Field trip", "Parent-teacher meeting", "Head lice notice", "Sports day", "Library books",
+          "School photos", "Homework reminder", "Holiday schedule", "Concert rehearsal", "Swimming lesson"]
+BODY = ("Dear parents, please note the following information about the upcoming activities of the class. "
+        "Do not hesitate to contact the teacher if you have any questions. Kind regards, the class team.")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a large synthetic school dataset.")
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--teachers", type=int, default=None, help="defaults to classes / 2 (at least 1)")
+    parser.add_argument("--teachers-per-class", type=int, default=2)
+    parser.add_argument("--parents", type=int, default=20_000)
+    parser.add_argument("--children", type=int, default=40_000)
+    parser.add_argument("--announcements", type=int, default=2_000_000)
+    parser.add_argument("--parent-share", type=float, default=0.3,
+                        help="fraction of announcements sent to a single parent instead of a class")
+    parser.add_argument("--max-classes-per-announcement", type=int, default=3,
+                        help="class announcements go to 1..N of the author's classes")
+    parser.add_argument("--years", type=float, default=5, help="history spread of announcement timestamps")
+    parser.add_argument("--batch-size", type=int, default=50_000)
+    parser.add_argument("--prefix", default="scale", help="prefix for usernames and class names (must be unique per run)")
+    parser.add_argument("--password", default="12341234", help="password of every generated user")
+    parser.add_argument("--seed", type=int, default=42, help="random seed, for reproducible datasets")
+    return parser.parse_args(argv)
+
+
+def _next_id(connection, model) -> int:
+    return (connection.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_rows(connection, table, columns, batch):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow(["" if value is None else value for value in row])
+    buffer.seek(0)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+    finally:
+        cursor.close()
+
+
+def bulk_load(connection, model, columns, rows, batch_size) -> int:
+    """Write rows (tuples matching columns) in batches; returns the number of rows written."""
+    table = model.__table__
+    use_copy = connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2"
+    total = 0
+    for batch in _batches(rows, batch_size):
+        if use_copy:
+            _copy_rows(connection, table, columns, batch)
+        else:
+            connection.execute(table.insert(), [dict(zip(columns, row)) for row in batch])
+        total += len(batch)
+    return total
+
+
+def _reset_sequences(connection):
+    if connection.dialect.name != "postgresql":
+        return
+    for table in ("users", "classes", "children", "announcements"):
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE((SELECT MAX(id) FROM {table}), 1))"
+        ))
+
+
+def generate(args) -> dict:
+    rng = random.Random(args.seed)
+    engine = init_engine()
+    n_teachers = args.teachers or max(1, args.classes // 2)
+    password_hash = hash_password(args.password)  # hashed once, shared by every generated user
+    now = datetime.now(timezone.utc)
+    counts = {}
+
+    with engine.begin() as connection:
+        user_id = _next_id(connection, User)
+        class_id = _next_id(connection, Class)
+        child_id = _next_id(connection, Child)
+        announcement_id = _next_id(connection, Announcement)
+
+        teacher_ids = list(range(user_id, user_id + n_teachers))
+        parent_ids = list(range(user_id + n_teachers, user_id + n_teachers + args.parents))
+        class_ids = list(range(class_id, class_id + args.classes))
+
+        def users():
+            for role, ids in (("teacher", teacher_ids), ("parent", parent_ids)):
+                for n, uid in enumerate(ids, start=1):
+                    username = f"{args.prefix}_{role[0]}{n:06d}"
+                    yield (uid, username, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                           f"{username}@example.com", password_hash, role, now)
+
+        counts["users"] = bulk_load(
+            connection, User,
+            ["id", "username", "first_name", "last_name", "email", "password_hash", "role", "created_at"],
+            users(), args.batch_size,
+        )
+
+        counts["classes"] = bulk_load(
+            connection, Class, ["id", "name", "created_at"],
+            ((cid, f"{args.prefix}-{n:04d}", now) for n, cid in enumerate(class_ids, start=1)),
+            args.batch_size,
+        )
+
+        # Every class gets teachers_per_class distinct teachers, round-robin so the
+        # load is spread evenly over all teachers.
+        teachers_of_class = {}
+        classes_of_teacher = {}
+
+        def assignments():
+            per_class = min(args.teachers_per_class, n_teachers)
+            for n, cid in enumerate(class_ids):
+                chosen = [teacher_ids[(n * per_class + k) % n_teachers] for k in range(per_class)]
+                teachers_of_class[cid] = chosen
+                for tid in dict.fromkeys(chosen):
+                    classes_of_teacher.setdefault(tid, []).append(cid)
+                    yield (tid, cid)
+
+        counts["teacher_classes"] = bulk_load(
+            connection, TeacherClass, ["teacher_id", "class_id"], assignments(), args.batch_size
+        )
+
+        # Every parent has at least one child (when there are enough children);
+        # the rest are spread randomly.
+        def children():
+            for n in range(args.children):
+                parent = parent_ids[n] if n < len(parent_ids) else rng.choice(parent_ids)
+                yield (child_id + n, parent, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                       rng.choice(class_ids), now)
+
+        counts["children"] = bulk_load(
+            connection, Child, ["id", "parent_id", "first_name", "last_name", "class_id", "created_at"],
+            children() if parent_ids else iter(()), args.batch_size,
+        )
+
+        # Timestamps grow with the id, as they do in production.
+        span = timedelta(days=365 * args.years)
+        start = now - span
+
+        def announcements():
+            """(announcement row, recipient rows) per announcement."""
+            for n in range(args.announcements):
+                aid = announcement_id + n
+                created_at = start + span * (n / max(1, args.announcements))
+                if parent_ids and rng.random() < args.parent_share:
+                    recipients = [("parent", rng.choice(parent_ids))]
+                    author = rng.choice(teacher_ids)
+                else:
+                    first_class = rng.choice(class_ids)
+                    author = rng.choice(teachers_of_class[first_class])
+                    others = classes_of_teacher[author]
+                    extra = rng.randint(0, min(args.max_classes_per_announcement, len(others)) - 1)
+                    chosen = dict.fromkeys([first_class] + rng.sample(others, extra))
+                    recipients = [("class", cid) for cid in chosen]
+                yield ((aid, rng.choice(TITLES), BODY, author, created_at),
+                       [(aid, recipient_type, recipient_id, created_at) for recipient_type, recipient_id in recipients])
+
+        # Both tables are written from the same random sequence, replayed
+        rng_state = rng.getstate()
+        counts["announcements"] = bulk_load(
+            connection, Announcement,
+            ["id", "title", "body", "created_by_id", "created_at"],
+            (announcement for announcement, _ in announcements()), args.batch_size,
+        )
+        rng.setstate(rng_state)
+        counts["announcement_recipients"] = bulk_load(
+            connection, AnnouncementRecipient,
+            ["announcement_id", "recipient_type", "recipient_id", "created_at"],
+            (recipient for _, recipients in announcements() for recipient in recipients), args.batch_size,
+        )
+
+        _reset_sequences(connection)
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("ANALYZE"))
+
+    return counts
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    counts = generate(args)
+    elapsed = time.perf_counter() - started
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    print(f"Dataset generated in {elapsed:.1f}s. Every user's password is '{args.password}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,82 @@
 # filename: app/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.routers import auth, users, classes, announcements, children, admin, teacher, upload, parents, ai
 from fastapi.middleware.cors import CORSMiddleware
-from app.core.database import Base, engine
-from sqlalchemy import text, inspect
-from app.seed import seed  # Import the seed function
+from app.core.config import Settings, settings
+from app.core.database import (
+    ReadYourWritesMiddleware, init_engine, dispose_engine, init_async_engine, dispose_async_engine, async_engines,
+)
+from app.core.startup import prepare_database
+from app.core.events import start_broker, stop_broker
+from app.core.security import shutdown_hash_executor
+from app.core.llm import close_client as close_llm_client
+from app.utils.rate_limit import close_backend as close_rate_limit_backend
+from app.utils.throttle import ThrottleHeadersMiddleware
+from app.core.query_counter import QueryCountMiddleware, install_query_counter
 
 
-app = FastAPI(title="Klasstra")
+def create_app(app_settings: Settings = settings) -> FastAPI:
+    """
+    Build the application without touching the database. Each worker opens its own
+    engine in the lifespan startup hook, after any fork, and disposes it on shutdown.
+    """
 
-# Add CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],  # explicitly allow the Vue dev server origin
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Check (and, if enabled, migrate/seed) the schema before serving traffic.
+        # Nothing is dropped: the database is owned by Alembic migrations.
+        prepare_database(init_engine(app_settings), app_settings)
+        # The sync engine is only needed for the startup tasks above.
+        dispose_engine()
+
+        init_async_engine(app_settings)
+        if app_settings.SQL_QUERY_COUNT_HEADER:
+            for async_engine in async_engines():
+                install_query_counter(async_engine.sync_engine)
+        await start_broker(app_settings)
+        yield
+        # Runs after the server has drained in-flight requests.
+        await stop_broker()
+        shutdown_hash_executor()
+        await close_rate_limit_backend()
+        await close_llm_client()
+        await dispose_async_engine()
+
+    app = FastAPI(title=app_settings.PROJECT_NAME, lifespan=lifespan)
+
+    # Add CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=app_settings.CORS_ORIGINS,  # the Vue dev server by default
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        # Let the frontend read the throttling headers (app/utils/throttle.py)
+        expose_headers=["RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset", "RateLimit-Policy", "Retry-After"],
+    )
+
+    app.add_middleware(ThrottleHeadersMiddleware)
+
+    if app_settings.SQL_QUERY_COUNT_HEADER:
+        app.add_middleware(QueryCountMiddleware)
+
+    if app_settings.DATABASE_REPLICA_URLS:
+        app.add_middleware(ReadYourWritesMiddleware)
+
+    # Include API routers
+    app.include_router(auth.router)
+    app.include_router(users.router)
+    app.include_router(classes.router)
+    app.include_router(announcements.router)
+    app.include_router(children.router)
+    app.include_router(admin.router)
+    app.include_router(teacher.router)
+    app.include_router(upload.router)
+    app.include_router(parents.router)
+    app.include_router(ai.router)
 
-# Reset the database schema on startup
-with engine.connect() as connection:
-    connection = connection.execution_options(isolation_level="AUTOCOMMIT")  # Enable autocommit mode
-
-    inspector = inspect(engine)
-    tables = inspector.get_table_names()
-
-    if tables:
-        print("Dropping all tables except 'alembic_version'...")
-        for table in tables:
-            if table != "alembic_version":
-                connection.execute(text(f"DROP TABLE IF EXISTS {table} CASCADE"))
-                print(f"Dropped table: {table}")
-        print("All applicable tables dropped.")
-    else:
-        print("No tables found. Skipping drop.")
-
-    print("Recreating tables...")
-    Base.metadata.create_all(engine)
-    print("Database tables created.")
-
-# Seed the database with sample data
-print("Seeding the database with sample data...")
-seed()
-print("Database seeding complete.")
-
-
-# Include API routers
-app.include_router(auth.router)
-app.include_router(users.router)
-app.include_router(classes.router)
-app.include_router(announcements.router)
-app.include_router(children.router)
-app.include_router(admin.router)
-app.include_router(teacher.router)
-app.include_router(upload.router)
-app.include_router(parents.router)
-app.include_router(ai.router)
+    return app
 
 
+app = create_app()
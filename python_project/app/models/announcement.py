@@ -1,6 +1,7 @@
 # filename: app/models/announcement.py
 
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from datetime import datetime, timezone
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -14,22 +15,43 @@ class Announcement(Base):
     created_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     last_updated_by_id = Column(Integer, ForeignKey("users.id"), nullable=True)
 
-    recipient_type = Column(String, nullable=False)   # "class" or "parent"
-    recipient_id = Column(Integer, nullable=False)    # class_id or user_id
-
     # Optional: store a file path or URL if there’s an attachment
     attachment_url = Column(String, nullable=True)
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Set by the app as well as by the database: SQLite's CURRENT_TIMESTAMP has no
+    # fractional seconds and a different text format than the values SQLAlchemy
+    # binds, which breaks the (created_at, id) comparisons of feed cursors.
+    # AnnouncementRecipient.created_at repeats this value.
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    # Both users are serialised with every announcement (AnnouncementOut), so they are
+    # loaded in the same query; an AsyncSession cannot lazy load them later.
     created_by = relationship(
         "User",
         foreign_keys=[created_by_id],
-        backref="announcements_created"
+        backref="announcements_created",
+        lazy="joined"
     )
     last_updated_by = relationship(
         "User",
         foreign_keys=[last_updated_by_id],
-        backref="announcements_updated"
+        backref="announcements_updated",
+        lazy="joined"
+    )
+
+    # Classes and parents the announcement was sent to; one announcement row is
+    # shared by all of them. Loaded with one extra query per page of announcements.
+    recipients = relationship(
+        "AnnouncementRecipient",
+        back_populates="announcement",
+        cascade="all, delete-orphan",
+        lazy="selectin"
+    )
+
+    # The teacher feed also lists the teacher's own announcements, newest first
+    # (id included so that lookup never reads the table); the recipient lookups
+    # are indexed on announcement_recipients.
+    __table_args__ = (
+        Index("ix_announcements_created_by_id_created_at", "created_by_id", "created_at", "id"),
     )
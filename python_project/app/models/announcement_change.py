@@ -0,0 +1,50 @@
+# filename: app/models/announcement_change.py
+from sqlalchemy import BigInteger, Column, Integer, String, DateTime, Index
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from app.core.database import Base
+
+
+class current_txid(FunctionElement):
+    """The id of the writing transaction on PostgreSQL; NULL on other databases."""
+    type = BigInteger()
+    inherit_cache = True
+
+
+@compiles(current_txid)
+def _compile_current_txid(element, compiler, **kw):
+    return "NULL"
+
+
+@compiles(current_txid, "postgresql")
+def _compile_current_txid_postgresql(element, compiler, **kw):
+    return "txid_current()"
+
+
+class AnnouncementChange(Base):
+    """
+    Change log behind /announcements/for_parent/changes: one row per recipient
+    of an announcement each time it is created, updated or deleted.
+
+    Deleted announcements (and their recipients) are gone, so the rows are not
+    foreign keys; they are the tombstones.
+    """
+    __tablename__ = "announcement_changes"
+
+    id = Column(Integer, primary_key=True)  # increasing; the sync position
+    # Writing transaction, which orders the log in commit order on PostgreSQL, where
+    # the migration makes it NOT NULL; always NULL on other databases
+    txid = Column(BigInteger, default=current_txid())
+    announcement_id = Column(Integer, nullable=False)
+    change = Column(String, nullable=False)  # "upsert" or "delete"
+    recipient_type = Column(String, nullable=False)  # as in announcement_recipients
+    recipient_id = Column(Integer, nullable=False)
+    changed_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # A parent's changes: one range per recipient, after the client's position
+        Index("ix_announcement_changes_recipient_id", "recipient_type", "recipient_id", "id"),
+        Index("ix_announcement_changes_recipient_txid", "recipient_type", "recipient_id", "txid", "id"),
+        # Pruning old rows
+        Index("ix_announcement_changes_changed_at", "changed_at"),
+    )
@@ -0,0 +1,27 @@
+# filename: app/models/announcement_recipient.py
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, PrimaryKeyConstraint
+from sqlalchemy.orm import relationship
+from app.core.database import Base
+
+
+class AnnouncementRecipient(Base):
+    """One class or parent an announcement was sent to."""
+    __tablename__ = "announcement_recipients"
+
+    announcement_id = Column(Integer, ForeignKey("announcements.id", ondelete="CASCADE"), nullable=False)
+    recipient_type = Column(String, nullable=False)   # "class" or "parent"
+    recipient_id = Column(Integer, nullable=False)    # class_id or user_id
+
+    # Copy of announcements.created_at, so the feeds can sort and page on this
+    # table's index and only join the announcements of the current page.
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    announcement = relationship("Announcement", back_populates="recipients")
+
+    __table_args__ = (
+        PrimaryKeyConstraint("announcement_id", "recipient_type", "recipient_id", name="announcement_recipient_pk"),
+        Index(
+            "ix_announcement_recipients_recipient_created_at",
+            "recipient_type", "recipient_id", "created_at", "announcement_id",
+        ),
+    )
@@ -0,0 +1,22 @@
+# filename: app/models/parent_inbox.py
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index, PrimaryKeyConstraint
+from app.core.database import Base
+
+
+class ParentInbox(Base):
+    """
+    One announcement in one parent's feed, written when the announcement is
+    created (see app/services/parent_inbox.py). Only used when PARENT_INBOX is on.
+    """
+    __tablename__ = "parent_inbox"
+
+    parent_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)  # copy of announcements.created_at
+    announcement_id = Column(Integer, ForeignKey("announcements.id", ondelete="CASCADE"), nullable=False)
+
+    __table_args__ = (
+        # The parent feed is a range scan on this key
+        PrimaryKeyConstraint("parent_id", "created_at", "announcement_id", name="parent_inbox_pk"),
+        # Removing an announcement from every inbox
+        Index("ix_parent_inbox_announcement_id", "announcement_id"),
+    )
@@ -6,9 +6,10 @@ class TeacherClass(Base):
     __tablename__ = "teacher_classes"
     
     teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False)
+    class_id = Column(Integer, ForeignKey("classes.id"), nullable=False, index=True)
 
-    # We enforce uniqueness on (teacher_id, class_id) pairs.
+    # We enforce uniqueness on (teacher_id, class_id) pairs. The primary key also
+    # serves lookups by teacher_id; class_id has its own index.
     __table_args__ = (
         PrimaryKeyConstraint('teacher_id', 'class_id', name='teacher_class_pk'),
     )
@@ -0,0 +1,55 @@
+# filename: app/prune_announcement_changes.py
+"""
+Delete announcement_changes rows older than ANNOUNCEMENT_CHANGES_RETENTION_DAYS
+(or --days). Clients whose sync cursor is older get 410 from
+/announcements/for_parent/changes and reload their feed.
+
+    cd python_project
+    python -m app.prune_announcement_changes [--days 30]
+
+Run it daily, e.g. from cron.
+"""
+import sys
+import os
+
+# Add the project root to sys.path to allow imports from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, func, select
+
+from app.core.config import settings
+from app.core.database import init_engine
+from app.models.announcement_change import AnnouncementChange
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Prune the announcement change log.")
+    parser.add_argument("--days", type=int, default=settings.ANNOUNCEMENT_CHANGES_RETENTION_DAYS,
+                        help="keep this many days of changes")
+    return parser.parse_args(argv)
+
+
+def prune(days: int) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=days)
+    # The newest row always stays: an empty log would hand out position 0 again
+    # (and SQLite would reuse ids), hiding the prune from clients still at 0
+    newest = select(func.max(AnnouncementChange.id)).scalar_subquery()
+    with init_engine().begin() as connection:
+        return connection.execute(
+            delete(AnnouncementChange)
+            .where(AnnouncementChange.changed_at < cutoff, AnnouncementChange.id < newest)
+        ).rowcount
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"announcement_changes: {prune(args.days)} rows older than {args.days} days deleted.")
+
+
+if __name__ == "__main__":
+    main()
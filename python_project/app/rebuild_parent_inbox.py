@@ -0,0 +1,79 @@
+# filename: app/rebuild_parent_inbox.py
+"""
+Rebuild the parent_inbox table (PARENT_INBOX) from children and
+announcement_recipients.
+
+    cd python_project
+    python -m app.rebuild_parent_inbox                          # every parent
+    python -m app.rebuild_parent_inbox --parent-id 12 --parent-id 40
+
+Run it for every parent before turning PARENT_INBOX on, and for the affected
+parents after children were added, moved to another class or removed outside
+the API. Parents are rebuilt --batch-size at a time, one transaction per batch:
+a parent's feed never shows a half-built inbox, and a full rebuild (tens of
+millions of rows on a production-sized database) does not hold one huge
+transaction open.
+"""
+import sys
+import os
+
+# Add the project root to sys.path to allow imports from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+import argparse
+import time
+
+from sqlalchemy import select, text
+
+from app.core.database import init_engine
+from app.models.user import User
+from app.services.parent_inbox import rebuild_statements
+from app.models import class_, announcement, announcement_recipient, child, parent_inbox  # noqa: F401  (register the models)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild the parent inbox table.")
+    parser.add_argument("--parent-id", type=int, action="append", dest="parent_ids",
+                        help="only rebuild this parent's inbox (repeatable; default: every parent)")
+    parser.add_argument("--batch-size", type=int, default=200, help="parents per transaction")
+    return parser.parse_args(argv)
+
+
+def rebuild(parent_ids=None, batch_size=200) -> int:
+    """Replace the inbox rows of parent_ids (or of everyone); returns the number of rows written."""
+    engine = init_engine()
+    full = parent_ids is None
+    if full:
+        # Deleted users lose their rows through the foreign key
+        with engine.connect() as connection:
+            parent_ids = connection.execute(select(User.id).order_by(User.id)).scalars().all()
+
+    rows = 0
+    for start in range(0, len(parent_ids), batch_size):
+        batch = parent_ids[start:start + batch_size]
+        clear, fill = rebuild_statements(batch)
+        with engine.begin() as connection:
+            connection.execute(clear)
+            rows += connection.execute(fill).rowcount
+        if full:
+            print(f"{start + len(batch)}/{len(parent_ids)} users, {rows} rows")
+
+    if full and engine.dialect.name == "postgresql":
+        with engine.connect() as connection:
+            connection.execute(text("ANALYZE parent_inbox"))
+            connection.commit()
+    return rows
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    rows = rebuild(args.parent_ids, args.batch_size)
+    scope = "every parent" if args.parent_ids is None else f"{len(args.parent_ids)} parent(s)"
+    print(f"parent_inbox: {rows} rows for {scope}, rebuilt in {time.perf_counter() - started:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,54 +1,67 @@
 # filename: app/routers/admin.py
+import os
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt  # type: ignore
-from app.core.config import settings
+from app.core.auth import Principal, get_current_principal, user_cache
 from app.models.user import User
 from app.models.teacher_class import TeacherClass
 from app.utils.roles import can_manage_users
+from app.core.metrics import collect_metrics
 
 router = APIRouter(prefix="/admin", tags=["admin"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 @router.put("/user/{user_id}/class_rep")
-def make_class_rep(user_id: int, token: str=Depends(oauth2_scheme), db: Session=Depends(get_db)):
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    if not can_manage_users(payload.get("role")):
+async def make_class_rep(user_id: int, principal: Principal = Depends(get_current_principal), db: AsyncSession=Depends(get_db)):
+    if not can_manage_users(principal.role):
         raise HTTPException(status_code=403, detail="Not allowed")
-    user = db.query(User).filter(User.id==user_id).first()
+    user = (await db.execute(select(User).where(User.id==user_id))).scalars().first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     user.role = "class_rep"
-    db.commit()
+    await db.commit()
+    user_cache.invalidate(user_id)
     return {"detail": "User promoted to class_rep"}
 
 @router.post("/assign-teacher-class")
-def assign_teacher_class(
+async def assign_teacher_class(
     teacher_id: int,
     class_id: int,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Assign a teacher (teacher_id) to a class (class_id).
     Only admins can do this.
     """
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    if not can_manage_users(payload.get("role")):
+    if not can_manage_users(principal.role):
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    teacher = db.query(User).filter(User.id == teacher_id, User.role=="teacher").first()
+    teacher = (await db.execute(
+        select(User).where(User.id == teacher_id, User.role=="teacher")
+    )).scalars().first()
     if not teacher:
         raise HTTPException(status_code=400, detail="Invalid teacher_id or user is not a teacher.")
 
     # Ensure we don't duplicate
-    existing = db.query(TeacherClass).filter_by(teacher_id=teacher_id, class_id=class_id).first()
+    existing = (await db.execute(
+        select(TeacherClass).filter_by(teacher_id=teacher_id, class_id=class_id)
+    )).scalars().first()
     if existing:
         return {"detail": "Teacher is already assigned to this class."}
 
     teacher_class = TeacherClass(teacher_id=teacher_id, class_id=class_id)
     db.add(teacher_class)
-    db.commit()
+    await db.commit()
     return {"detail": f"Assigned teacher_id={teacher_id} to class_id={class_id}."}
+
+@router.get("/metrics")
+async def get_metrics(principal: Principal = Depends(get_current_principal)):
+    """
+    Runtime metrics of the worker that handles the request (connection pool
+    usage, checkout wait times and timeouts). Only admins can see this.
+    """
+    if not can_manage_users(principal.role):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return {"pid": os.getpid(), **collect_metrics()}
@@ -1,52 +1,25 @@
 # filename: python_project/app/routers/ai.py
+import hashlib
+import json
+from typing import AsyncIterator, Awaitable, Callable
+
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-import openai
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.schemas.ai import AIRequest, AIResponse
+from app.core.auth import Principal, get_current_principal
 from app.core.database import get_db
+from app.core import llm
+from app.core.ai_cache import cache_key, generation_cache, normalize_input
 from app.core.config import settings
 from app.utils.roles import can_manage_users, can_create_announcements  # Adapt as needed
+from app.utils.throttle import throttle
 
 router = APIRouter(prefix="/ai", tags=["ai"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-@router.post("/generate", response_model=AIResponse)
-def generate_text(
-    payload: AIRequest,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-):
-    """
-    Synchronous endpoint to call GPT-3.5-turbo to transform unstructured text 
-    into a well-formatted announcement in German, French, and English.
-    
-    Requires a valid JWT token (role 'teacher', 'admin', or 'class_rep').
-    Will sign the output with the teacher's name (from the token).
-    """
-    # 1. Decode JWT token to verify user role
-    try:
-        decoded = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    role = decoded.get("role")
-    if role not in ["teacher", "admin", "class_rep"]:
-        raise HTTPException(status_code=403, detail="Not allowed to use AI endpoint")
-    
-    # Optional: get teacher's name from the token
-    teacher_name = decoded.get("sub", "Teacher")
-
-    # 2. Set OpenAI API key
-    openai.api_key = settings.OPENAI_API_KEY
-    if not openai.api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-
-    # 3. Build the system prompt
-# Adjusted system_prompt for the AI Assistant endpoint
-    system_prompt = (
+# System prompt of /ai/generate
+GENERATE_SYSTEM_PROMPT = (
     "You are a helpful AI assistant for a school environment. "
     "You receive unstructured or minimal text from a teacher, and your goal is to produce "
     "an improved announcement or message in French, German, and English, always addressed to the parents. "
@@ -87,76 +60,184 @@ def generate_text(
     "Use professional and friendly language, and always include the correct team signature ('F1')."
 )
 
+# Part of the generation cache key: editing the prompt retires the cached results
+GENERATE_PROMPT_VERSION = hashlib.sha256(GENERATE_SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:16]
+
+
+def _require_ai_role(principal: Principal) -> None:
+    if principal.role not in ["teacher", "admin", "class_rep"]:
+        raise HTTPException(status_code=403, detail="Not allowed to use AI endpoint")
 
 
+def _announcement_prompt(principal: Principal, payload: AIRequest) -> tuple[list[dict], str]:
+    """The messages for the model and the generation cache key of an /ai/generate request."""
+    # Optional: get teacher's name from the token
+    teacher_name = principal.username
 
-    # Build user text: includes the raw user text
+    # Build user text: includes the teacher's input, with whitespace normalized
+    input_text = normalize_input(payload.input_text)
     user_text = (
         f"The teacher's name is {teacher_name}. "
         f"Here is the teacher's input:\n"
-        f"{payload.input_text}"
+        f"{input_text}"
     )
+    messages = [
+        {"role": "system", "content": GENERATE_SYSTEM_PROMPT},
+        {"role": "user", "content": user_text},
+    ]
+    return messages, cache_key(settings.OPENAI_MODEL, GENERATE_PROMPT_VERSION, input_text, teacher_name)
+
+
+@router.post("/generate", response_model=AIResponse, dependencies=[Depends(throttle("ai"))])
+async def generate_text(
+    payload: AIRequest,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Call the model (OPENAI_MODEL, GPT-3.5-turbo by default) to transform unstructured text
+    into a well-formatted announcement in German, French, and English.
+    
+    Requires a valid JWT token (role 'teacher', 'admin', or 'class_rep').
+    Will sign the output with the teacher's name (from the token).
+    Repeated inputs are answered from the generation cache (cached=true).
+    """
+    # 1. Verify the user role
+    _require_ai_role(principal)
+
+    # 2. Build the prompt and its cache key
+    messages, key = _announcement_prompt(principal, payload)
+
+    # 3. Call the chat completions API (pooled, with timeouts and retries),
+    # unless the same input was already generated for this teacher
+    async def generate() -> str:
+        ai_content = await llm.chat_completion(messages, max_tokens=600, temperature=0.7)
+        return ai_content.strip()
 
-    # 4. Call the ChatCompletions API synchronously
     try:
-        print("Calling openai.ChatCompletion.create with prompt:", user_text)
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_text},
-            ],
-            max_tokens=600,
-            temperature=0.7,
-        )
-        print("Received ChatCompletion response:", response)
-    except Exception as e:
+        ai_content, cached = await generation_cache.get_or_generate(key, generate)
+    except llm.LLMError as e:
         print("OpenAI API error:", e)
-        raise HTTPException(status_code=500, detail=f"OpenAI API error: {e}")
-    
-    # 5. Parse and return the AI's content
-    ai_content = response["choices"][0]["message"]["content"].strip()
-    return AIResponse(output_text=ai_content)
+        raise HTTPException(status_code=e.status_code, detail=f"OpenAI API error: {e}")
+
+    # 4. Return the AI's content
+    return AIResponse(output_text=ai_content, cached=cached)
 
 
-@router.post("/chat")
-def chat_with_ai(
+@router.post("/chat", dependencies=[Depends(throttle("ai"))])
+async def chat_with_ai(
     payload: dict,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Chat with the AI (GPT-3.5-turbo). Requires a valid JWT token (role 'teacher', 'admin', or 'class_rep').
     """
-    # Decode the token to verify the user role
-    try:
-        decoded = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid token")
-    
-    role = decoded.get("role")
-    if role not in ["teacher", "admin", "class_rep"]:
-        raise HTTPException(status_code=403, detail="Not allowed to use AI endpoint")
+    # Verify the user role
+    _require_ai_role(principal)
     
     # Get the message sent by the user
     user_message = payload.get('message')
 
-    # Set OpenAI API key
-    openai.api_key = settings.OPENAI_API_KEY
-    if not openai.api_key:
-        raise HTTPException(status_code=500, detail="OpenAI API key not configured")
-
-    # Call OpenAI's chat API
+    # Call the chat completions API
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": user_message}],
+        ai_response = await llm.chat_completion(
+            [{"role": "user", "content": user_message}],
             max_tokens=150,
             temperature=0.7,
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"OpenAI API error: {e}")
+    except llm.LLMError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"OpenAI API error: {e}")
 
     # Return the AI's response
-    ai_response = response['choices'][0]['message']['content']
-    return {"response": ai_response}
\ No newline at end of file
+    return {"response": ai_response}
+
+
+# Streaming variants. They answer with Server-Sent Events:
+#   data: {"delta": "..."}                       a piece of the text, as the model writes it
+#   event: done, data: {"cached": true|false}    the text is complete
+#   event: error, data: {"detail": "...", "status_code": 502}
+# Errors before the first piece are plain HTTP errors, as in the endpoints above.
+# When the client disconnects, the upstream request is closed and the model stops.
+
+def _sse(data: dict, event: str | None = None) -> str:
+    return (f"event: {event}\n" if event else "") + f"data: {json.dumps(data)}\n\n"
+
+
+def _event_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # no proxy buffering
+    )
+
+
+async def _start_stream(messages: list[dict], max_tokens: int) -> tuple[str, AsyncIterator[str]]:
+    """The first piece of a streamed completion, and the stream for the rest."""
+    pieces = llm.stream_chat_completion(messages, max_tokens=max_tokens, temperature=0.7)
+    try:
+        first = await anext(pieces)
+    except StopAsyncIteration:
+        first = ""
+    except llm.LLMError as e:
+        raise HTTPException(status_code=e.status_code, detail=f"OpenAI API error: {e}")
+    return first, pieces
+
+
+async def _completion_events(first: str, pieces: AsyncIterator[str],
+                             on_complete: Callable[[str], Awaitable[None]] | None = None):
+    text = [first]
+    try:
+        if first:
+            yield _sse({"delta": first})
+        async for piece in pieces:
+            text.append(piece)
+            yield _sse({"delta": piece})
+    except llm.LLMError as e:
+        print("OpenAI API error:", e)
+        yield _sse({"detail": f"OpenAI API error: {e}", "status_code": e.status_code}, "error")
+        return
+    finally:
+        await pieces.aclose()
+    if on_complete is not None:
+        await on_complete("".join(text))
+    yield _sse({"cached": False}, "done")
+
+
+async def _cached_events(text: str):
+    yield _sse({"delta": text})
+    yield _sse({"cached": True}, "done")
+
+
+@router.post("/generate/stream", dependencies=[Depends(throttle("ai"))])
+async def generate_text_stream(
+    payload: AIRequest,
+    principal: Principal = Depends(get_current_principal),
+):
+    """
+    /ai/generate, streamed as Server-Sent Events. A cached result arrives as one
+    piece; a completed stream is added to the cache, a cancelled one is not.
+    """
+    _require_ai_role(principal)
+    messages, key = _announcement_prompt(principal, payload)
+
+    cached_text = await generation_cache.get(key)
+    if cached_text is not None:
+        return _event_response(_cached_events(cached_text))
+
+    async def remember(text: str) -> None:
+        await generation_cache.put(key, text.strip())
+
+    first, pieces = await _start_stream(messages, max_tokens=600)
+    return _event_response(_completion_events(first, pieces, remember))
+
+
+@router.post("/chat/stream", dependencies=[Depends(throttle("ai"))])
+async def chat_with_ai_stream(
+    payload: dict,
+    principal: Principal = Depends(get_current_principal),
+):
+    """/ai/chat, streamed as Server-Sent Events."""
+    _require_ai_role(principal)
+    first, pieces = await _start_stream([{"role": "user", "content": payload.get('message')}], max_tokens=150)
+    return _event_response(_completion_events(first, pieces))
@@ -1,135 +1,225 @@
 # filename: app/routers/announcements.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from app.core.database import get_db
-from app.schemas.announcement import AnnouncementCreate, AnnouncementOut
-from app.models.announcement import Announcement
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt  # type: ignore
+import asyncio
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.core.database import AsyncSessionLocal, get_db, get_read_db
+from app.core import events
+from app.schemas.announcement import AnnouncementChanges, AnnouncementCreate, AnnouncementOut, AnnouncementPage
+from app.schemas.auth import StreamTicket
+from app.core.auth import (
+    STREAM_SCOPE, Principal, create_access_token, decode_token, get_current_principal, get_current_user,
+    optional_oauth2_scheme,
+)
 from app.core.config import settings
 from app.utils.roles import can_create_announcements, is_parent
-from app.utils.rate_limit import check_rate_limit
-from app.models.child import Child
-from sqlalchemy import or_
-from sqlalchemy.orm import joinedload
+from app.utils.throttle import throttle
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, page
+from app.utils.etag import not_modified
+from app.services import announcements as announcement_service
+from sqlalchemy import select
 from app.models.child import Child
 from app.models.user import User
 from app.models.teacher_class import TeacherClass
-from python_project.app.schemas.user import UserOut
+from app.schemas.user import UserOut
 
 
 
 router = APIRouter(prefix="/announcements", tags=["announcements"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-@router.post("/", response_model=AnnouncementOut)
-def create_announcement(
+# Milliseconds a browser waits before reconnecting a closed stream
+SSE_RETRY_MS = 3000
+
+@router.post("/", response_model=AnnouncementOut, dependencies=[Depends(throttle("announcements"))])
+async def create_announcement(
     a: AnnouncementCreate, 
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    author: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    user_id = payload.get("user_id")
-    role = payload.get("role")
-    if not can_create_announcements(role):
+    if not can_create_announcements(principal.role):
         raise HTTPException(status_code=403, detail="Not allowed")
-    if not check_rate_limit(user_id):
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
-
-    ann = Announcement(
-        title=a.title,
-        body=a.body,
-        created_by=user_id,
-        last_updated_by=user_id,
-        recipient_type=a.recipient_type,
-        recipient_id=a.recipient_id
-    )
-    db.add(ann)
-    db.commit()
-    db.refresh(ann)
-    return ann
-
-@router.get("/for_parent", response_model=List[AnnouncementOut])
-def get_announcements_for_parent(
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+
+    # One announcement for all the requested classes and parents
+    return await announcement_service.create_announcement(db, author, a)
+
+
+@router.get("/for_parent", response_model=AnnouncementPage)
+async def get_announcements_for_parent(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Returns announcements targeted to this parent's user_id (recipient_type='parent')
-    AND announcements for all classes that any of this parent's children are in.
+    AND announcements for all classes that any of this parent's children are in,
+    newest first, one page at a time (see app/utils/pagination.py).
+    Answers 304 when the page has not changed since the client's ETag.
     """
-    # Decode JWT token to extract user details
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    user_role = payload.get("role")
-    user_id = payload.get("user_id")
+    user_role = principal.role
+    user_id = principal.user_id
 
     # Only parents (or class_rep acting as parents) can access
     if not is_parent(user_role):
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    # 1) Query classes of this parent's children
-    child_classes = db.query(Child.class_id).filter(Child.parent_id == user_id).all()
-    class_ids = [row.class_id for row in child_classes]
-
-    # 2) Query class announcements
-    class_announcements = db.query(Announcement).options(
-        joinedload(Announcement.created_by)  # Ensure creator is eagerly loaded
-    ).filter(
-        Announcement.recipient_type == "class",
-        Announcement.recipient_id.in_(class_ids)
-    ).all()
-
-    # 3) Query direct announcements to the parent
-    parent_announcements = db.query(Announcement).options(
-        joinedload(Announcement.created_by)  # Ensure creator is eagerly loaded
-    ).filter(
-        Announcement.recipient_type == "parent",
-        Announcement.recipient_id == user_id
-    ).all()
+    if settings.PARENT_INBOX:
+        stmt = announcement_service.parent_inbox_feed_statement(user_id, cursor, limit)
+    else:
+        stmt = announcement_service.parent_feed_statement(user_id, cursor, limit)
+
+    # The recipients shown depend on the parent, so the user is part of the version
+    version = (await db.execute(announcement_service.page_version_statement(stmt))).all()
+    unchanged = not_modified(request, response, user_id, cursor, limit, [tuple(row) for row in version])
+    if unchanged:
+        return unchanged
+    announcements = (await db.execute(stmt)).scalars().all()
+    return page(announcements, limit)
+
+
+@router.get("/for_parent/changes", response_model=AnnouncementChanges)
+async def get_announcement_changes_for_parent(
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)  # a lagging replica could skip changes
+):
+    """
+    Delta sync for /for_parent: the announcements created or updated and the ids
+    of those deleted after the since cursor, oldest change first.
 
-    # Combine and return the announcements
-    combined_announcements = class_announcements + parent_announcements
-    return combined_announcements
+    Call it without since before loading the feed to get a starting cursor.
+    410 means the changes were pruned; reload the feed and start over. Adding a
+    child changes which announcements the feed holds, so reload the feed then too.
+    """
+    if not is_parent(principal.role):
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return await announcement_service.parent_changes(db, principal.user_id, since, limit)
 
 
 @router.get("/teacher/parents", response_model=List[UserOut])
-def get_teacher_parents(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_teacher_parents(principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_read_db)):
     """
     Fetch parents associated with the teacher's assigned classes.
     Accessible by 'teacher' and 'class_rep' roles.
     """
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    except jwt.JWTError:
-        raise HTTPException(status_code=403, detail="Could not validate credentials")
-
-    role = payload.get("role")
-    user_id = payload.get("user_id")
+    role = principal.role
+    user_id = principal.user_id
 
     if role not in ["teacher", "class_rep", "admin"]:
         raise HTTPException(status_code=403, detail="Not allowed")
 
     if role == "admin":
         # Admins can fetch all parents
-        parents = db.query(User).filter(User.role == "parent").all()
+        parents = (await db.execute(select(User).where(User.role == "parent"))).scalars().all()
         return parents
     else:
         # Teachers and class_reps fetch parents of their classes
         # Step 1: Get all classes assigned to the teacher
-        teacher_classes = db.query(TeacherClass.class_id).filter(TeacherClass.teacher_id == user_id).all()
+        teacher_classes = await db.execute(select(TeacherClass.class_id).where(TeacherClass.teacher_id == user_id))
         class_ids = [tc.class_id for tc in teacher_classes]
 
         if not class_ids:
             return []
 
         # Step 2: Get all children in those classes
-        children = db.query(Child).filter(Child.class_id.in_(class_ids)).all()
+        children = (await db.execute(select(Child).where(Child.class_id.in_(class_ids)))).scalars().all()
         parent_ids = list({child.parent_id for child in children})
 
         if not parent_ids:
             return []
 
         # Step 3: Fetch unique parents
-        parents = db.query(User).filter(User.id.in_(parent_ids), User.role == "parent").all()
-        return parents
\ No newline at end of file
+        parents = (await db.execute(
+            select(User).where(User.id.in_(parent_ids), User.role == "parent")
+        )).scalars().all()
+        return parents
+
+def _concerns(event: dict, role: str, user_id: int, class_ids: set[int]) -> bool:
+    """Whether an announcement event belongs in this user's feed."""
+    if class_ids.intersection(event["classes"]):
+        return True
+    if is_parent(role):
+        return event["parents"] is None or user_id in event["parents"]
+    return event["created_by_id"] == user_id  # a teacher's own announcements
+
+
+async def _event_stream(role: str, user_id: int, class_ids: set[int]):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.SSE_STREAM_SECONDS
+    async with events.get_broker().subscribe() as queue:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(settings.SSE_KEEPALIVE_SECONDS, remaining))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event is None:  # the stream fell behind, or the worker is stopping
+                return
+            if _concerns(event, role, user_id, class_ids):
+                yield f"event: {event['type']}\ndata: {json.dumps({'id': event['id']})}\n\n"
+
+
+@router.post("/stream-ticket", response_model=StreamTicket)
+async def create_stream_ticket(principal: Principal = Depends(get_current_principal)):
+    """
+    A ticket for /announcements/stream?ticket=..., for browsers (EventSource
+    cannot send headers). The URL, and so the ticket, ends up in access logs:
+    it expires after SSE_TICKET_SECONDS and only opens the stream.
+    """
+    ticket = create_access_token(
+        {"sub": principal.username, "role": principal.role, "user_id": principal.user_id, "scope": STREAM_SCOPE},
+        expires_delta=settings.SSE_TICKET_SECONDS,
+    )
+    return StreamTicket(ticket=ticket, expires_in=settings.SSE_TICKET_SECONDS)
+
+
+@router.get("/stream")
+async def stream_announcement_events(
+    ticket: Optional[str] = Query(None, description="Ticket from POST /announcements/stream-ticket, for clients that cannot send headers"),
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+):
+    """
+    Server-Sent Events for the announcements in the caller's feed: "created",
+    "updated" and "deleted" events whose data is {"id": ...}. Parents get the
+    announcements sent to them or to their children's classes, teachers those
+    sent to their classes or written by them.
+
+    Streams end after SSE_STREAM_SECONDS and the browser reconnects; events sent
+    while disconnected are not replayed, so clients reload their feed whenever
+    the stream (re)opens.
+
+    Authenticates with the access token in the Authorization header or, since
+    URLs are logged, with a short-lived ticket in the query string; the ticket
+    is only checked when the stream opens, so a browser reconnects with a new one.
+    """
+    if header_token:
+        principal = decode_token(header_token)
+    elif ticket:
+        principal = decode_token(ticket, scope=STREAM_SCOPE)
+    else:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    role = principal.role
+    user_id = principal.user_id
+
+    if is_parent(role):
+        class_ids_query = select(Child.class_id).where(Child.parent_id == user_id)
+    elif role == "teacher":
+        class_ids_query = select(TeacherClass.class_id).where(TeacherClass.teacher_id == user_id)
+    else:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    # A short-lived session: the stream must not hold a pooled connection open
+    async with AsyncSessionLocal() as db:
+        class_ids = set((await db.execute(class_ids_query)).scalars())
+
+    return StreamingResponse(
+        _event_stream(role, user_id, class_ids),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},  # no proxy buffering
+    )
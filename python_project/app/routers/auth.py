@@ -1,27 +1,37 @@
 # filename: app/routers/auth.py
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.core.database import get_db
-from app.core.security import verify_password
+from app.core.security import verify_and_update_password_async
 from app.core.auth import create_access_token
 from app.models.user import User
 from app.schemas.auth import Token
+from app.utils.throttle import throttle
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
-@router.post("/login", response_model=Token)
-def login(
+@router.post("/login", response_model=Token, dependencies=[Depends(throttle("login"))])
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(), 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # form_data.username and form_data.password are transmitted as form data
-    user = db.query(User).filter(
+    user = (await db.execute(select(User).where(
         (User.username == form_data.username) | (User.email == form_data.username)
-    ).first()
+    ))).scalars().first()
 
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Hashing runs on the bounded hashing pool; 503 when it is saturated
+    valid, new_hash = await verify_and_update_password_async(form_data.password, user.password_hash)
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        # Stored with an outdated scheme or cost: replace it while we have the password
+        user.password_hash = new_hash
+        await db.commit()
 
     # Create JWT token
     token = create_access_token(
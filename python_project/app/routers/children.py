@@ -1,58 +1,73 @@
 # filename: app/routers/children.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_read_db
 from app.schemas.child import ChildBase, ChildOut
 from app.models.child import Child
 from app.models.class_ import Class
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt  # type: ignore
+from app.core.auth import Principal, get_current_principal
 from app.core.config import settings
 from app.utils.roles import is_parent
+from app.utils.etag import not_modified
+from app.services import parent_inbox
 
 router = APIRouter(prefix="/children", tags=["children"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 @router.post("/", response_model=ChildOut)
-def add_child(c: ChildBase, token: str=Depends(oauth2_scheme), db: Session=Depends(get_db)):
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    if not is_parent(payload.get("role")) or payload.get("user_id") != c.parent_id:
+async def add_child(c: ChildBase, principal: Principal = Depends(get_current_principal), db: AsyncSession=Depends(get_db)):
+    if not is_parent(principal.role) or principal.user_id != c.parent_id:
         raise HTTPException(status_code=403, detail="Not allowed")
 
     # Check if the class exists
-    cls = db.query(Class).filter(Class.id == c.class_id).first()
+    cls = (await db.execute(select(Class).where(Class.id == c.class_id))).scalars().first()
     if not cls:
         raise HTTPException(status_code=400, detail="Invalid class_id. Class does not exist.")
 
     ch = Child(**c.dict())
     db.add(ch)
-    db.commit()
-    db.refresh(ch)
+    if settings.PARENT_INBOX:
+        # The new child's class brings its announcements into the parent's inbox
+        await db.flush()
+        for stmt in parent_inbox.rebuild_statements([c.parent_id]):
+            await db.execute(stmt)
+    await db.commit()
+    await db.refresh(ch)
     return ch
 
 @router.get("/my", response_model=list[ChildOut])
-def get_my_children(
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
+async def get_my_children(
+    request: Request,
+    response: Response,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Returns a list of children for the currently logged-in parent/class_rep,
-    including the class name for each child.
+    including the class name for each child. Answers 304 when nothing changed
+    since the client's ETag.
     """
-    # Decode token
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    except jwt.JWTError:
-        raise HTTPException(status_code=403, detail="Invalid token")
-    
-    user_role = payload.get("role")
-    user_id = payload.get("user_id")
+    user_role = principal.role
+    user_id = principal.user_id
     
     # Ensure only parents (or class_reps) can fetch children
     if not is_parent(user_role):
         raise HTTPException(status_code=403, detail="Not allowed")
     
+    # Every child's id, class and timestamps: a count or max id can stay the same
+    # when one child is removed and another added
+    version = (await db.execute(
+        select(Child.id, Child.class_id, Child.updated_at, Class.updated_at)
+        .join(Class, Class.id == Child.class_id)
+        .where(Child.parent_id == user_id)
+        .order_by(Child.id)
+    )).all()
+    unchanged = not_modified(request, response, [tuple(row) for row in version])
+    if unchanged:
+        return unchanged
+
     # Query all children that belong to this parent’s user_id, joining with Class
-    children = db.query(Child).options(joinedload(Child.class_)).filter(Child.parent_id == user_id).all()
+    # Child.class_ is eager (joined) loaded
+    children = (await db.execute(select(Child).where(Child.parent_id == user_id))).scalars().all()
     
     return children
\ No newline at end of file
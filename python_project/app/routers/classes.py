@@ -1,29 +1,33 @@
 # filename: app/routers/classes.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_read_db
 from app.models.class_ import Class
 from app.schemas.class_ import ClassBase, ClassOut
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt  # type: ignore
-from app.core.config import settings
+from app.core.auth import Principal, get_current_principal
 from app.utils.roles import can_manage_users
+from app.utils.etag import not_modified
 
 router = APIRouter(prefix="/classes", tags=["classes"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 @router.post("/", response_model=ClassOut)
-def create_class(c: ClassBase, token: str=Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    if not can_manage_users(payload.get("role")):
+async def create_class(c: ClassBase, principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_db)):
+    if not can_manage_users(principal.role):
         raise HTTPException(status_code=403, detail="Not allowed")
     cls = Class(name=c.name)
     db.add(cls)
-    db.commit()
-    db.refresh(cls)
+    await db.commit()
+    await db.refresh(cls)
     return cls
 
 @router.get("/", response_model=list[ClassOut])
-def list_classes(db: Session = Depends(get_db)):
+async def list_classes(request: Request, response: Response, db: AsyncSession = Depends(get_read_db)):
     # No auth needed, or optionally add auth if required.
-    return db.query(Class).all()
+    version = (await db.execute(
+        select(func.count(Class.id), func.max(Class.id), func.max(Class.updated_at))
+    )).one()
+    unchanged = not_modified(request, response, *version)
+    if unchanged:
+        return unchanged
+    return (await db.execute(select(Class))).scalars().all()
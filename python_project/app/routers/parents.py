@@ -1,28 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt  # type: ignore
-from app.core.config import settings
-from app.core.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.auth import Principal, get_current_principal
+from app.core.database import get_read_db
 from app.models.user import User
 from app.schemas.user import UserOut
 from app.utils.roles import can_manage_users
 
 router = APIRouter(prefix="/parents", tags=["parents"])
 
-# Define the OAuth2 scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
-
 @router.get("/", response_model=list[UserOut])
-def get_parents(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_parents(principal: Principal = Depends(get_current_principal), db: AsyncSession = Depends(get_read_db)):
     """
     Fetch all users with the role 'parent'.
     """
-    # Decode the token and check permissions
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    if not can_manage_users(payload.get("role")):
+    # Check permissions
+    if not can_manage_users(principal.role):
         raise HTTPException(status_code=403, detail="Not allowed")
 
     # Query all users with the 'parent' role
-    parents = db.query(User).filter(User.role == "parent").all()
+    parents = (await db.execute(select(User).where(User.role == "parent"))).scalars().all()
     return parents
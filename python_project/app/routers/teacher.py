@@ -1,191 +1,148 @@
 # filename: app/routers/teacher.py
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session, joinedload
-from typing import List
-from app.core.database import get_db
-from app.models.user import User
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.core.database import get_db, get_read_db
 from app.models.class_ import Class
 from app.models.teacher_class import TeacherClass
 from app.models.announcement import Announcement
-from app.schemas.announcement import AnnouncementOut, AnnouncementCreate, AnnouncementUpdate
-from app.core.config import settings
-from fastapi.security import OAuth2PasswordBearer
-from jose import jwt  # type: ignore
+from app.schemas.announcement import AnnouncementOut, AnnouncementCreate, AnnouncementUpdate, AnnouncementPage
+from app.core.auth import Principal, get_current_principal, get_current_user
 from app.utils.roles import can_create_announcements
+from app.utils.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, page
+from app.utils.etag import not_modified
+from app.utils.throttle import throttle
+from app.services import announcements as announcement_service
+from app.services import parent_inbox
 from app.schemas.class_ import ClassOut  # Import the correct schema
+from app.schemas.user import UserOut
 
 router = APIRouter(prefix="/teacher", tags=["teacher"])
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
 @router.get("/my-classes", response_model=List[ClassOut])  # Use ClassOut instead of Class
-def get_my_classes(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Return a list of classes assigned to the logged-in teacher."""
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    if payload.get("role") != "teacher":
+async def get_my_classes(
+    request: Request,
+    response: Response,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Return a list of classes assigned to the logged-in teacher (304 if unchanged)."""
+    if principal.role != "teacher":
         raise HTTPException(status_code=403, detail="Not allowed")
-    teacher_id = payload.get("user_id")
-
-    class_ids = db.query(TeacherClass.class_id)\
-                  .filter(TeacherClass.teacher_id == teacher_id).all()
-    if not class_ids:
-        return []
-    # Extract just the IDs
-    c_ids = [r.class_id for r in class_ids]
-    classes = db.query(Class).filter(Class.id.in_(c_ids)).all()
+    teacher_id = principal.user_id
+
+    # One statement answers both cases: the version is derived from the rows.
+    # The ids themselves, not a count or sum: swapping one assignment for another
+    # can keep those, and assignment rows have no timestamp of their own
+    classes = (await db.execute(
+        select(Class)
+        .join(TeacherClass, TeacherClass.class_id == Class.id)
+        .where(TeacherClass.teacher_id == teacher_id)
+        .order_by(Class.id)
+    )).scalars().all()
+    unchanged = not_modified(request, response, [(cls.id, cls.updated_at) for cls in classes])
+    if unchanged:
+        return unchanged
     return [ClassOut.from_orm(cls) for cls in classes]  # Convert to Pydantic models
 
 
 
-@router.get("/my-announcements", response_model=List[AnnouncementOut])
-def get_my_announcements(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+@router.get("/my-announcements", response_model=AnnouncementPage)
+async def get_my_announcements(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_read_db)
+):
     """
     Return announcements for all classes that the teacher is assigned to.
     Also includes any announcements created_by this teacher (if relevant).
+    Newest first, one page at a time (see app/utils/pagination.py); 304 if the
+    page has not changed since the client's ETag.
     """
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    if payload.get("role") != "teacher":
+    if principal.role != "teacher":
         raise HTTPException(status_code=403, detail="Not allowed")
-    teacher_id = payload.get("user_id")
-
-    # 1) Get the classes this teacher belongs to
-    class_ids = db.query(TeacherClass.class_id)\
-                  .filter(TeacherClass.teacher_id == teacher_id).all()
-    c_ids = [r.class_id for r in class_ids]
-
-    # 2) Announcements for those classes
-    ann_class = db.query(Announcement)\
-        .options(joinedload(Announcement.created_by))\
-        .filter(Announcement.recipient_type=="class", Announcement.recipient_id.in_(c_ids))
+    teacher_id = principal.user_id
 
-    # 3) Also announcements the teacher created (if you want to unify them)
-    ann_created_by_me = db.query(Announcement)\
-        .options(joinedload(Announcement.created_by))\
-        .filter(Announcement.created_by_id==teacher_id)
+    # Announcements sent to the teacher's classes plus the teacher's own, in one
+    # statement (see app/services/announcements.py)
+    stmt = announcement_service.teacher_feed_statement(teacher_id, cursor, limit)
+    version = (await db.execute(announcement_service.page_version_statement(stmt))).all()
+    unchanged = not_modified(request, response, cursor, limit, [tuple(row) for row in version])
+    if unchanged:
+        return unchanged
+    announcements = (await db.execute(stmt)).scalars().all()
+    return page(announcements, limit)
 
-    # Combine sets (SQL Alchemy queries as sets):
-    announcements = ann_class.union(ann_created_by_me).all()
-    return announcements
 
-
-@router.post("/announcements", response_model=List[AnnouncementOut])
-def create_teacher_announcements(
+@router.post("/announcements", response_model=List[AnnouncementOut], dependencies=[Depends(throttle("announcements"))])
+async def create_teacher_announcements(
     announcement: AnnouncementCreate,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    teacher_user: UserOut = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
-    # Decode JWT token
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    except jwt.JWTError:
-        raise HTTPException(status_code=403, detail="Could not validate credentials")
-    
-    user_id = payload.get("user_id")
-    role = payload.get("role")
-    
-    if not can_create_announcements(role):
+    if not can_create_announcements(principal.role):
         raise HTTPException(status_code=403, detail="Not allowed")
-    
-    # Fetch the teacher user
-    teacher_user = db.query(User).filter(User.id == user_id, User.role == "teacher").first()
-    if not teacher_user:
+    if teacher_user.role != "teacher":
         raise HTTPException(status_code=404, detail="Teacher not found")
-    
-    new_announcements = []
-    
-    # Create announcements for classes
-    for class_id in announcement.classes:
-        cls = db.query(Class).filter(Class.id == class_id).first()
-        if not cls:
-            raise HTTPException(status_code=400, detail=f"Class with id {class_id} does not exist")
-        
-        ann = Announcement(
-            title=announcement.title,
-            body=announcement.body,
-            attachment_url=announcement.attachment_url,
-            created_by_id=teacher_user.id,
-            recipient_type="class",
-            recipient_id=class_id
-        )
-        db.add(ann)
-        new_announcements.append(ann)
-    
-    # Create announcements for parents
-    for parent_id in announcement.parents:
-        parent_user = db.query(User).filter(User.id == parent_id, User.role == "parent").first()
-        if not parent_user:
-            raise HTTPException(status_code=400, detail=f"Parent with id {parent_id} does not exist")
-        
-        ann = Announcement(
-            title=announcement.title,
-            body=announcement.body,
-            attachment_url=announcement.attachment_url,
-            created_by_id=teacher_user.id,
-            recipient_type="parent",
-            recipient_id=parent_id
-        )
-        db.add(ann)
-        new_announcements.append(ann)
-    
-    db.commit()
-    
-    # Refresh and collect the announcements to return
-    for ann in new_announcements:
-        db.refresh(ann)
-    
-    return new_announcements
+
+    # One announcement shared by all the selected classes and parents
+    ann = await announcement_service.create_announcement(db, teacher_user, announcement)
+    return [ann]
 
 
 @router.delete("/announcements/{announcement_id}")
-def delete_teacher_announcement(
+async def delete_teacher_announcement(
     announcement_id: int,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """Delete an announcement if you are the creator."""
-    payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    teacher_id = payload.get("user_id")
-    role = payload.get("role")
+    teacher_id = principal.user_id
+    role = principal.role
     if role != "teacher":
         raise HTTPException(status_code=403, detail="Not allowed")
 
-    ann = db.query(Announcement).filter(Announcement.id == announcement_id).first()
+    ann = (await db.execute(select(Announcement).where(Announcement.id == announcement_id))).scalars().first()
     if not ann:
         raise HTTPException(status_code=404, detail="Announcement not found")
     if ann.created_by_id != teacher_id:
         raise HTTPException(status_code=403, detail="You can only delete your own announcement")
 
-    db.delete(ann)
-    db.commit()
+    # Tombstones first: deleting the announcement deletes its recipients
+    await db.execute(announcement_service.record_change_statement(announcement_id, "delete"))
+    await db.execute(parent_inbox.remove_statement(announcement_id))
+    await db.delete(ann)
+    await db.commit()
+    await announcement_service.publish_change("deleted", ann)
     return {"detail": "Announcement deleted"}
 
 
 @router.patch("/announcements/{announcement_id}", response_model=AnnouncementOut)
-def update_teacher_announcement(
+async def update_teacher_announcement(
     announcement_id: int,
     announcement_data: AnnouncementUpdate,
-    token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
+    principal: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Update an existing announcement (title, body, attachment_url).
     Only the teacher who created the announcement can update it.
     """
-    # Decode token
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
-    except:
-        raise HTTPException(status_code=403, detail="Could not validate credentials")
-
-    user_id = payload.get("user_id")
-    role = payload.get("role")
+    user_id = principal.user_id
+    role = principal.role
 
     # Check if user can create/edit announcements
     if not can_create_announcements(role):
         raise HTTPException(status_code=403, detail="Not allowed")
 
     # Retrieve the announcement
-    ann = db.query(Announcement).filter(Announcement.id == announcement_id).first()
+    ann = (await db.execute(select(Announcement).where(Announcement.id == announcement_id))).scalars().first()
     if not ann:
         raise HTTPException(status_code=404, detail="Announcement not found")
 
@@ -204,6 +161,8 @@ def update_teacher_announcement(
     # Record who last updated it
     ann.last_updated_by_id = user_id
 
-    db.commit()
-    db.refresh(ann)
+    await db.execute(announcement_service.record_change_statement(announcement_id, "upsert"))
+    await db.commit()
+    await db.refresh(ann)
+    await announcement_service.publish_change("updated", ann)
     return ann
\ No newline at end of file
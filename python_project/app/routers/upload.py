@@ -1,14 +1,16 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 import os
 import shutil
 from uuid import uuid4
+from app.core.config import settings
+from app.utils.throttle import throttle
 
 router = APIRouter(prefix="/upload", tags=["upload"])
 
-UPLOAD_DIR = "uploads"  # Directory to store files (adjust as needed)
+UPLOAD_DIR = settings.UPLOAD_DIR  # Directory to store files
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-@router.post("/")
+@router.post("/", dependencies=[Depends(throttle("upload"))])
 async def upload_file(file: UploadFile = File(...)):
     """
     Handles file uploads and returns the URL of the uploaded file.
@@ -25,7 +27,7 @@ async def upload_file(file: UploadFile = File(...)):
         
         # Return the file's public URL (adjust base URL as needed)
         base_url = "http://127.0.0.1:8000"  # Change this for production
-        file_url = f"{base_url}/{UPLOAD_DIR}/{file_id}{extension}"
+        file_url = f"{base_url}/uploads/{file_id}{extension}"
         return {"url": file_url}
     except Exception as e:
         raise HTTPException(status_code=500, detail="File upload failed") from e
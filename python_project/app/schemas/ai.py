@@ -6,3 +6,4 @@ class AIRequest(BaseModel):
 
 class AIResponse(BaseModel):
     output_text: str
+    cached: bool = False  # served from the generation cache, without calling the model
@@ -14,22 +14,44 @@ class AnnouncementCreate(AnnouncementBase):
     classes: List[int] = []
     parents: List[int] = []
 
+class RecipientOut(BaseModel):
+    recipient_type: str  # "class" or "parent"
+    recipient_id: int    # class_id or user_id
+
+    class Config:
+        from_attributes = True
+
 class AnnouncementOut(BaseModel):
     id: int
     title: str
     body: str
     created_by: UserOut
     last_updated_by: Optional[UserOut]
-    recipient_type: str
-    recipient_id: int
+    recipients: List[RecipientOut]
     attachment_url: Optional[str]
     created_at: datetime
     updated_at: Optional[datetime]
 
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 class AnnouncementUpdate(BaseModel):
     title: Optional[str] = None
     body: Optional[str] = None
-    attachment_url: Optional[str] = None
\ No newline at end of file
+    attachment_url: Optional[str] = None
+
+class AnnouncementPage(BaseModel):
+    """One page of a feed, newest first; pass next_cursor back to get the next page."""
+    items: List[AnnouncementOut]
+    next_cursor: Optional[str] = None
+
+class AnnouncementChanges(BaseModel):
+    """
+    Changes to a feed since a sync cursor: announcements created or updated
+    (changed) and ids of deleted ones. Pass next_since back to continue; keep
+    going while has_more.
+    """
+    changed: List[AnnouncementOut]
+    deleted: List[int]
+    next_since: str
+    has_more: bool = False
@@ -5,6 +5,11 @@ class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
 
+class StreamTicket(BaseModel):
+    """Opens /announcements/stream?ticket=... for expires_in seconds; good for nothing else."""
+    ticket: str
+    expires_in: int
+
 class LoginData(BaseModel):
     username: str
     password: str
@@ -1,21 +1,26 @@
 # filename: app/seed.py
 import sys
 import os
+from datetime import datetime, timezone
 
 # Add the project root to sys.path to allow imports from 'app'
 current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.abspath(os.path.join(current_dir, '..'))
 sys.path.insert(0, project_root)
 
-from app.core.database import SessionLocal
+from app.core.database import SessionLocal, init_engine
 from app.models.user import User
 from app.models.class_ import Class
 from app.models.child import Child
 from app.models.announcement import Announcement
+from app.models.announcement_recipient import AnnouncementRecipient
 from app.models.teacher_class import TeacherClass  # Import TeacherClass model
 from app.core.security import hash_password
+from app.core.config import Settings, settings
+from app.services import parent_inbox
 
-def seed():
+def seed(app_settings: Settings = settings):
+    init_engine(app_settings)
     db = SessionLocal()
     try:
         # Create an admin user if not exists
@@ -137,19 +142,28 @@ def seed():
             Announcement.created_by_id == teacher_user.id
         ).all()
         if not existing_announcements:
+            now = datetime.now(timezone.utc)  # recipients repeat the announcement's created_at
             announcement1 = Announcement(
                 title="Welcome to F1!",
                 body="We will start with basic lessons next week.",
                 created_by_id=teacher_user.id,  # Use 'created_by_id' instead of 'created_by'
-                recipient_type="class",
-                recipient_id=class_objects[0].id,  # F1
+                created_at=now,
+                recipients=[AnnouncementRecipient(
+                    recipient_type="class",
+                    recipient_id=class_objects[0].id,  # F1
+                    created_at=now,
+                )],
             )
             announcement2 = Announcement(
                 title="F2 Activity Reminder",
                 body="Don't forget to prepare for the upcoming activity.",
                 created_by_id=teacher_user.id,  # Use 'created_by_id' instead of 'created_by'
-                recipient_type="class",
-                recipient_id=class_objects[1].id,  # F2
+                created_at=now,
+                recipients=[AnnouncementRecipient(
+                    recipient_type="class",
+                    recipient_id=class_objects[1].id,  # F2
+                    created_at=now,
+                )],
             )
             db.add_all([announcement1, announcement2])
             db.commit()
@@ -157,6 +171,12 @@ def seed():
         else:
             print("Announcements already exist for teacher1.")
 
+        if app_settings.PARENT_INBOX:
+            for stmt in parent_inbox.rebuild_statements([parent_user.id]):
+                db.execute(stmt)
+            db.commit()
+            print("Inbox of parent1 rebuilt.")
+
     except Exception as e:
         print(f"An error occurred during seeding: {e}")
     finally:
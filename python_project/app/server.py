@@ -0,0 +1,58 @@
+# filename: app/server.py
+"""
+Production entry point:
+
+    cd python_project
+    python -m app.server
+
+Runs uvicorn with WEB_CONCURRENCY worker processes. Schema checks, migrations
+and seeding happen once here before the workers are spawned; each worker then
+opens its own connection pool in the app's lifespan hook. For gunicorn
+(e.g. with --preload) use gunicorn.conf.py instead.
+"""
+import sys
+import os
+
+# Add the project root to sys.path to allow imports from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+import uvicorn
+
+from app.core.config import settings
+from app.core.database import init_engine, dispose_engine
+from app.core.startup import mark_database_prepared, prepare_database, share_jwt_secret
+
+
+def uvicorn_options() -> dict:
+    return {
+        "host": settings.HOST,
+        "port": settings.PORT,
+        "workers": settings.WEB_CONCURRENCY,
+        "loop": settings.SERVER_LOOP,
+        "http": settings.SERVER_HTTP,
+        "timeout_keep_alive": settings.KEEPALIVE_TIMEOUT,
+        # On SIGTERM uvicorn stops accepting connections and waits this long for
+        # in-flight requests before running the lifespan shutdown.
+        "timeout_graceful_shutdown": settings.GRACEFUL_TIMEOUT,
+        "proxy_headers": True,
+    }
+
+
+def main():
+    # Migrate/seed in the parent so that N workers never race on DDL; the workers
+    # only repeat the one-query revision check.
+    prepare_database(init_engine(settings), settings)
+    mark_database_prepared()
+    # Don't leak the parent's pooled connections into the workers.
+    dispose_engine()
+
+    # Workers are spawned and import the config again: give them all one secret.
+    share_jwt_secret(settings)
+
+    uvicorn.run("app.main:app", **uvicorn_options())
+
+
+if __name__ == "__main__":
+    main()
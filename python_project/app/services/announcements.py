@@ -0,0 +1,309 @@
+# filename: app/services/announcements.py
+"""
+Announcement creation and feed queries shared by the announcement and teacher
+routers.
+
+An announcement is stored once; every class or parent it was sent to is a row
+in announcement_recipients. The feeds page through the recipients index (which
+carries a copy of created_at) and only load the announcements of the page.
+With PARENT_INBOX the parent feed reads the parent_inbox table instead (see
+app/services/parent_inbox.py).
+
+Every write also logs one announcement_changes row per recipient, which the
+delta sync (parent_changes) reads.
+"""
+from datetime import datetime, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import DateTime, Integer, String, Select, and_, func, insert, literal, or_, select, tuple_, union
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from app.core import events
+from app.core.config import settings
+from app.models.announcement import Announcement
+from app.models.announcement_change import AnnouncementChange
+from app.models.announcement_recipient import AnnouncementRecipient
+from app.models.child import Child
+from app.models.class_ import Class
+from app.models.parent_inbox import ParentInbox
+from app.models.teacher_class import TeacherClass
+from app.models.user import User
+from app.schemas.announcement import AnnouncementCreate, AnnouncementOut, RecipientOut
+from app.schemas.user import UserOut
+from app.utils.pagination import decode_cursor, encode_cursor, paginate
+from app.services import parent_inbox
+
+
+def _announcements_page(ids: Select, cursor: str | None, limit: int) -> Select:
+    """
+    One page, newest first, of the announcements listed by ids, a select of
+    (announcement_id, created_at) rows.
+    """
+    ids = ids.subquery()
+    page_ids = paginate(
+        select(ids.c.announcement_id, ids.c.created_at), ids.c.created_at, ids.c.announcement_id, cursor, limit
+    ).subquery()
+    # Creator and last editor are eager loaded, recipients with one more query
+    return (
+        select(Announcement)
+        .join(page_ids, Announcement.id == page_ids.c.announcement_id)
+        .order_by(page_ids.c.created_at.desc(), page_ids.c.announcement_id.desc())
+    )
+
+
+def _own_recipients(parent_id: int):
+    """Load the classes an announcement went to, but no other parents."""
+    return selectinload(Announcement.recipients.and_(or_(
+        AnnouncementRecipient.recipient_type == "class",
+        AnnouncementRecipient.recipient_id == parent_id,
+    )))
+
+
+def _parent_page(ids: Select, parent_id: int, cursor: str | None, limit: int) -> Select:
+    return _announcements_page(ids, cursor, limit).options(_own_recipients(parent_id))
+
+
+def page_version_statement(feed: Select) -> Select:
+    """
+    (id, updated_at) of the announcements a feed statement returns, without
+    loading them or their recipients: the version of a page, for its ETag.
+    """
+    return feed.with_only_columns(Announcement.id, Announcement.updated_at, maintain_column_froms=True)
+
+
+def _parent_recipients(parent_id: int):
+    """
+    The parent's recipients: the class of each child, plus the parent directly.
+    Joining to this set (rather than OR-ing an IN subquery) lets the database
+    probe a (recipient_type, recipient_id, ...) index once per recipient; UNION
+    also drops the duplicate when two children share a class.
+    """
+    return union(
+        select(literal("class", String).label("recipient_type"), Child.class_id.label("recipient_id"))
+        .where(Child.parent_id == parent_id),
+        select(literal("parent", String), literal(parent_id, Integer)),
+    ).subquery()
+
+
+def parent_feed_statement(parent_id: int, cursor: str | None, limit: int) -> Select:
+    """
+    Announcements sent to the class of any of the parent's children or to the
+    parent directly, as a single statement.
+    """
+    recipients = _parent_recipients(parent_id)
+    ids = select(AnnouncementRecipient.announcement_id, AnnouncementRecipient.created_at).join(
+        recipients, and_(
+            AnnouncementRecipient.recipient_type == recipients.c.recipient_type,
+            AnnouncementRecipient.recipient_id == recipients.c.recipient_id,
+        )
+    ).distinct()  # sent to several of the parent's recipients
+    return _parent_page(ids, parent_id, cursor, limit)
+
+
+def parent_inbox_feed_statement(parent_id: int, cursor: str | None, limit: int) -> Select:
+    """The same feed as parent_feed_statement, read from the parent's inbox (PARENT_INBOX)."""
+    ids = select(ParentInbox.announcement_id, ParentInbox.created_at).where(ParentInbox.parent_id == parent_id)
+    return _parent_page(ids, parent_id, cursor, limit)
+
+
+def teacher_feed_statement(teacher_id: int, cursor: str | None, limit: int) -> Select:
+    """Announcements sent to the teacher's classes plus those the teacher wrote."""
+    class_ids = select(TeacherClass.class_id).where(TeacherClass.teacher_id == teacher_id)
+    ids = union(
+        select(AnnouncementRecipient.announcement_id, AnnouncementRecipient.created_at).where(
+            AnnouncementRecipient.recipient_type == "class",
+            AnnouncementRecipient.recipient_id.in_(class_ids),
+        ),
+        select(Announcement.id, Announcement.created_at).where(Announcement.created_by_id == teacher_id),
+    )
+    return _announcements_page(ids, cursor, limit)
+
+
+def record_change_statement(announcement_id: int, change: str):
+    """
+    Log an "upsert" or "delete" of the announcement for each of its recipients.
+    Run it in the write's transaction, and before deleting the recipients.
+    """
+    changed_at = datetime.now(timezone.utc)
+    return insert(AnnouncementChange).from_select(
+        ["announcement_id", "change", "recipient_type", "recipient_id", "changed_at"],
+        select(
+            AnnouncementRecipient.announcement_id,
+            literal(change, String),
+            AnnouncementRecipient.recipient_type,
+            AnnouncementRecipient.recipient_id,
+            literal(changed_at, DateTime(timezone=True)),
+        ).where(AnnouncementRecipient.announcement_id == announcement_id),
+    )
+
+
+async def parent_changes(db: AsyncSession, parent_id: int, since: str | None, limit: int) -> dict:
+    """
+    What changed in the parent's feed after the since cursor:
+    {"changed", "deleted", "next_since", "has_more"} (see AnnouncementChanges).
+
+    Without since, only returns the current position; take it before loading
+    the feed.
+
+    The log is read in commit order, so that a change committed late is never
+    behind a position already handed out. Change ids are allocated before
+    commit, so on PostgreSQL ids alone are not in commit order: the log is read
+    in (txid, id) order, up to the oldest transaction still running
+    (txid_snapshot_xmin). Every row before that point is committed, and later
+    rows can only come after it; a long transaction delays sync until it ends,
+    but never makes it skip a change. SQLite runs one write transaction at a
+    time, so its ids are already in commit order.
+    """
+    in_commit_order = db.get_bind().dialect.name == "postgresql"
+    # Bare columns, so that the (recipient, txid, id) index serves the range and the order
+    position = (AnnouncementChange.txid, AnnouncementChange.id) if in_commit_order else (AnnouncementChange.id,)
+    committed = (
+        [AnnouncementChange.txid < func.txid_snapshot_xmin(func.txid_current_snapshot())]
+        if in_commit_order else []
+    )
+
+    if since is None:
+        latest = (await db.execute(
+            select(AnnouncementChange.changed_at, AnnouncementChange.id)
+            .where(*committed)
+            .order_by(*(column.desc() for column in position)).limit(1)
+        )).first()
+        next_since = encode_cursor(*latest) if latest else encode_cursor(datetime.now(timezone.utc), 0)
+        return {"changed": [], "deleted": [], "next_since": next_since, "has_more": False}
+
+    _, since_id = decode_cursor(since)
+    # The client's position is a row it was given; it only disappears when the
+    # log is pruned, and changes after it may be gone too. Position 0 was handed
+    # out while the log was empty, which then starts at id 1 unless pruned.
+    since_txid = 0
+    if since_id:
+        row = (await db.execute(
+            select(AnnouncementChange.txid).where(AnnouncementChange.id == since_id)
+        )).first()
+        gone = row is None
+        if row is not None:
+            since_txid = row[0]
+    else:
+        gone = ((await db.execute(select(func.min(AnnouncementChange.id)))).scalar() or 1) > 1
+    if gone:
+        raise HTTPException(status_code=410, detail="Changes since this cursor are no longer available; reload the feed")
+    after = (
+        tuple_(*position) > tuple_(since_txid, since_id) if in_commit_order
+        else AnnouncementChange.id > since_id
+    )
+
+    recipients = _parent_recipients(parent_id)
+    rows = (await db.execute(
+        select(AnnouncementChange.id, AnnouncementChange.announcement_id,
+               AnnouncementChange.change, AnnouncementChange.changed_at)
+        .join(recipients, and_(
+            AnnouncementChange.recipient_type == recipients.c.recipient_type,
+            AnnouncementChange.recipient_id == recipients.c.recipient_id,
+        ))
+        .where(after, *committed)
+        .order_by(*position)
+        .limit(limit + 1)
+    )).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    latest_change = {}  # announcement id -> its last change in this batch
+    for row in rows:
+        latest_change[row.announcement_id] = row.change
+    upserted = [announcement_id for announcement_id, change in latest_change.items() if change == "upsert"]
+    changed = (await db.execute(
+        select(Announcement).where(Announcement.id.in_(upserted))
+        .options(_own_recipients(parent_id))
+        .order_by(Announcement.created_at.desc(), Announcement.id.desc())
+    )).scalars().all() if upserted else []
+    # An upserted announcement that is gone was deleted after this batch
+    found = {ann.id for ann in changed}
+    deleted = [announcement_id for announcement_id in latest_change if announcement_id not in found]
+
+    next_since = encode_cursor(rows[-1].changed_at, rows[-1].id) if rows else since
+    return {"changed": changed, "deleted": deleted, "next_since": next_since, "has_more": has_more}
+
+
+async def publish_change(event_type: str, ann: Announcement) -> None:
+    """Tell the event streams that ann was updated or deleted (after the commit)."""
+    await events.publish(
+        event_type, ann.id, ann.created_by_id,
+        [r.recipient_id for r in ann.recipients if r.recipient_type == "class"],
+        [r.recipient_id for r in ann.recipients if r.recipient_type == "parent"],
+    )
+
+
+async def _missing_ids(db: AsyncSession, column, ids: list[int], *where) -> list[int]:
+    """The ids of the list that have no row, found with one IN query."""
+    if not ids:
+        return []
+    found = set((await db.execute(select(column).where(column.in_(ids), *where))).scalars())
+    return [id for id in ids if id not in found]
+
+
+async def create_announcement(db: AsyncSession, author: UserOut, data: AnnouncementCreate) -> AnnouncementOut:
+    """
+    Store one announcement for all the classes and parents in data, and commit.
+
+    Takes a fixed number of statements however many recipients there are: one
+    IN query to validate the classes, one for the parents, one INSERT for the
+    announcement, one multi-row INSERT for the recipients and one INSERT ...
+    SELECT into the change log (plus one into the parent inboxes with
+    PARENT_INBOX). The response is built from what the INSERTs return, so
+    nothing is read back afterwards.
+    """
+    if not data.classes and not data.parents:
+        raise HTTPException(status_code=400, detail="Select at least one class or parent")
+
+    class_ids = list(dict.fromkeys(data.classes))
+    parent_ids = list(dict.fromkeys(data.parents))
+    missing = await _missing_ids(db, Class.id, class_ids)
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Class with id {missing[0]} does not exist")
+    missing = await _missing_ids(db, User.id, parent_ids, User.role == "parent")
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Parent with id {missing[0]} does not exist")
+
+    now = datetime.now(timezone.utc)
+    ann = (await db.execute(
+        insert(Announcement)
+        .values(
+            title=data.title,
+            body=data.body,
+            attachment_url=data.attachment_url,
+            created_by_id=author.id,
+            created_at=now,
+        )
+        .returning(Announcement.id, Announcement.created_at)
+    )).one()
+    recipients = [
+        {"announcement_id": ann.id, "recipient_type": "class", "recipient_id": class_id, "created_at": ann.created_at}
+        for class_id in class_ids
+    ] + [
+        {"announcement_id": ann.id, "recipient_type": "parent", "recipient_id": parent_id, "created_at": ann.created_at}
+        for parent_id in parent_ids
+    ]
+    # Passing a list to values() renders a single INSERT ... VALUES (...), (...)
+    recipient_rows = (await db.execute(
+        insert(AnnouncementRecipient)
+        .values(recipients)
+        .returning(AnnouncementRecipient.recipient_type, AnnouncementRecipient.recipient_id)
+    )).all()
+    await db.execute(record_change_statement(ann.id, "upsert"))
+    if settings.PARENT_INBOX:
+        await db.execute(parent_inbox.fan_out_statement(ann.id))
+    await db.commit()
+    await events.publish("created", ann.id, author.id, class_ids, parent_ids)
+
+    return AnnouncementOut(
+        id=ann.id,
+        title=data.title,
+        body=data.body,
+        created_by=author,
+        last_updated_by=None,
+        recipients=[RecipientOut.from_orm(row) for row in recipient_rows],
+        attachment_url=data.attachment_url,
+        created_at=ann.created_at,
+        updated_at=None,
+    )
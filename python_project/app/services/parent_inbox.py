@@ -0,0 +1,67 @@
+# filename: app/services/parent_inbox.py
+"""
+Fan-out-on-write parent inbox (PARENT_INBOX setting).
+
+Every announcement gets one parent_inbox row per parent who should see it: the
+parents it was sent to directly and the parents of every child in the classes
+it was sent to. The parent feed then reads a single range of the inbox's
+primary key instead of resolving children and classes on every request.
+
+The inbox is derived from children and announcement_recipients, so it goes
+stale when a child is added or moves class. The API rebuilds the parent's rows
+when it adds a child; changes made elsewhere need
+"python -m app.rebuild_parent_inbox".
+"""
+from sqlalchemy import Select, and_, delete, insert, select, union
+
+from app.models.announcement_recipient import AnnouncementRecipient
+from app.models.child import Child
+from app.models.parent_inbox import ParentInbox
+
+COLUMNS = ["parent_id", "created_at", "announcement_id"]
+
+
+def inbox_rows(parent_ids: list[int] | None = None, announcement_id: int | None = None) -> Select:
+    """
+    The (parent_id, created_at, announcement_id) rows the inbox should hold,
+    optionally only those of some parents or of one announcement.
+    """
+    by_class = select(Child.parent_id, AnnouncementRecipient.created_at, AnnouncementRecipient.announcement_id).join(
+        AnnouncementRecipient, and_(
+            AnnouncementRecipient.recipient_type == "class",
+            AnnouncementRecipient.recipient_id == Child.class_id,
+        )
+    )
+    direct = select(
+        AnnouncementRecipient.recipient_id, AnnouncementRecipient.created_at, AnnouncementRecipient.announcement_id
+    ).where(AnnouncementRecipient.recipient_type == "parent")
+    if parent_ids is not None:
+        by_class = by_class.where(Child.parent_id.in_(parent_ids))
+        direct = direct.where(AnnouncementRecipient.recipient_id.in_(parent_ids))
+    if announcement_id is not None:
+        by_class = by_class.where(AnnouncementRecipient.announcement_id == announcement_id)
+        direct = direct.where(AnnouncementRecipient.announcement_id == announcement_id)
+    # UNION drops the duplicates of siblings in one class, or of a parent who
+    # got the announcement both directly and through a class
+    return union(by_class, direct)
+
+
+def fan_out_statement(announcement_id: int):
+    """Insert the inbox rows of a new announcement (run after its recipients are inserted)."""
+    return insert(ParentInbox).from_select(COLUMNS, inbox_rows(announcement_id=announcement_id))
+
+
+def rebuild_statements(parent_ids: list[int] | None = None) -> list:
+    """Replace the inbox rows of the given parents, or of everyone; run them in one transaction."""
+    clear = delete(ParentInbox)
+    if parent_ids is not None:
+        clear = clear.where(ParentInbox.parent_id.in_(parent_ids))
+    return [clear, insert(ParentInbox).from_select(COLUMNS, inbox_rows(parent_ids=parent_ids))]
+
+
+def remove_statement(announcement_id: int):
+    """
+    Delete an announcement from every inbox. Run it before deleting the
+    announcement: SQLite does not enforce the ON DELETE CASCADE.
+    """
+    return delete(ParentInbox).where(ParentInbox.announcement_id == announcement_id)
@@ -0,0 +1,54 @@
+# filename: app/utils/pagination.py
+"""
+Keyset (cursor) pagination on (created_at, id), newest first.
+
+A page is fetched with "WHERE (created_at, id) < cursor ORDER BY created_at DESC,
+id DESC LIMIT n", so every page costs the same however far back the client
+scrolls. The cursor is the (created_at, id) of the last item of the previous
+page, base64 encoded; clients must treat it as opaque.
+"""
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import Select, tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(created_at: datetime, id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(stmt: Select, created_at, id, cursor: str | None, limit: int) -> Select:
+    """
+    Order stmt newest first on the given (created_at, id) columns and restrict it
+    to the page after cursor. One extra row is fetched to tell whether there is a
+    next page (see page()).
+    """
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(created_at, id) < tuple_(cursor_created_at, cursor_id))
+    return stmt.order_by(created_at.desc(), id.desc()).limit(limit + 1)
+
+
+def page(rows: list, limit: int) -> dict:
+    """{"items", "next_cursor"} from the rows of a paginate() query."""
+    items = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return {"items": items, "next_cursor": next_cursor}
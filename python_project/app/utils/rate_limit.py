@@ -1,14 +1,363 @@
 # filename: app/utils/rate_limit.py
-from collections import defaultdict
-from time import time
-from app.core.config import settings
-
-rates = defaultdict(list)
-
-def check_rate_limit(user_id: int) -> bool:
-    now = time()
-    rates[user_id] = [t for t in rates[user_id] if t > now - 60]
-    if len(rates[user_id]) >= settings.RATE_LIMIT:
-        return False
-    rates[user_id].append(now)
-    return True
+"""
+Rate limiting with sliding window counters.
+
+Each key keeps two counters, the current fixed window and the previous one,
+and a request is allowed while
+
+    previous * (share of the previous window still inside the sliding window) + current < limit
+
+That is O(1) state per key and closely tracks a true sliding window. Keys are
+"<namespace>:<user or client>" and must always be used with the same window.
+
+Where the counters live is pluggable (RATE_LIMIT_BACKEND):
+
+- "sqlite" (default): a SQLite file (RATE_LIMIT_SQLITE_PATH) shared by every
+  worker process on the host, so a limit means the same with any WEB_CONCURRENCY.
+- "redis": any Redis-protocol server (RATE_LIMIT_REDIS_URL), shared by several
+  hosts; needs the redis package. Checks run as one Lua script.
+- "memory": this process only; for tests, development and single workers.
+
+Idle keys expire after two windows: the memory backend drops them as it goes
+(and never holds more than RATE_LIMIT_MAX_KEYS), SQLite deletes them now and
+then, and Redis expires them itself.
+
+The same store also keeps short-lived markers (mark() / is_marked()), state
+that every worker must see, such as the read-your-writes pins of
+app/core/database.py.
+"""
+import asyncio
+import math
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import Settings, settings
+from app.core.metrics import register_metrics
+
+_stats = {"allowed": 0, "limited": 0, "errors": 0}
+
+
+@dataclass(frozen=True)
+class RateLimitResult:
+    allowed: bool
+    limit: int
+    remaining: int  # requests left in the sliding window after this one
+    reset_after: float  # seconds until the current window ends
+    retry_after: float  # seconds until a request would be allowed; 0 when allowed
+
+
+@dataclass
+class _Counters:
+    window_index: int
+    current: int
+    previous: int
+
+
+def _slide(counters: _Counters | None, now: float, window: float) -> _Counters:
+    """The counters moved forward to the window that contains now."""
+    index = int(now // window)
+    if counters is None or counters.window_index < index - 1:
+        return _Counters(index, 0, 0)
+    if counters.window_index == index - 1:
+        return _Counters(index, 0, counters.current)
+    return counters
+
+
+def _check(counters: _Counters, now: float, limit: int, window: float) -> RateLimitResult:
+    """Count one request against counters (already slid to now) if the limit allows it."""
+    if limit < 1:
+        return RateLimitResult(False, limit, 0, window, window)
+    elapsed = now - counters.window_index * window
+    weight = 1 - elapsed / window
+    estimate = counters.previous * weight + counters.current
+    reset_after = window - elapsed
+    if estimate + 1 <= limit:
+        counters.current += 1
+        remaining = max(0, math.floor(limit - estimate - 1))
+        return RateLimitResult(True, limit, remaining, reset_after, 0.0)
+
+    allowed_previous = limit - 1 - counters.current
+    if allowed_previous >= 0:
+        # This window has room once enough of the previous one has slid out
+        retry_after = window * (1 - allowed_previous / counters.previous) - elapsed
+    else:
+        # Wait for the next window, then for this window's count to slide out
+        retry_after = reset_after + window * (1 - (limit - 1) / counters.current)
+    return RateLimitResult(False, limit, 0, reset_after, max(retry_after, 0.0))
+
+
+class MemoryBackend:
+    """Counters in this process, least recently used first."""
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._counters: OrderedDict[str, tuple[float, _Counters]] = OrderedDict()  # key -> (expires, counters)
+        self._markers: OrderedDict[str, float] = OrderedDict()  # key -> expires
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        now = time.time()
+        # Idle keys are at the front: drop the expired ones
+        while self._counters:
+            expires, _ = next(iter(self._counters.values()))
+            if expires > now:
+                break
+            self._counters.popitem(last=False)
+
+        entry = self._counters.pop(key, None)
+        counters = _slide(entry[1] if entry else None, now, window)
+        result = _check(counters, now, limit, window)
+        self._counters[key] = ((counters.window_index + 2) * window, counters)
+        if len(self._counters) > self.max_keys:
+            self._counters.popitem(last=False)
+        return result
+
+    async def mark(self, key: str, seconds: float) -> None:
+        self._markers.pop(key, None)
+        self._markers[key] = time.time() + seconds
+        # Usually one marker lifetime for all keys, so the oldest expire first
+        now = time.time()
+        while self._markers and (next(iter(self._markers.values())) <= now
+                                 or len(self._markers) > self.max_keys):
+            self._markers.popitem(last=False)
+
+    async def is_marked(self, key: str) -> bool:
+        expires = self._markers.get(key)
+        return expires is not None and expires > time.time()
+
+    async def close(self) -> None:
+        pass
+
+    def key_count(self) -> int:
+        return len(self._counters)
+
+
+class SQLiteBackend:
+    """
+    Counters in a SQLite file that every worker on the host opens. Each check is
+    one short write transaction, run in a thread so lock waits do not block the
+    event loop.
+    """
+
+    CLEANUP_PROBABILITY = 0.001  # share of checks that also delete expired keys
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")  # losing the last counts on power loss is fine
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limits ("
+                " key TEXT PRIMARY KEY, window_index INTEGER NOT NULL, current INTEGER NOT NULL,"
+                " previous INTEGER NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS markers (key TEXT PRIMARY KEY, expires_at REAL NOT NULL)"
+            )
+            self._local.connection = connection
+        return connection
+
+    def _hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        connection = self._connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = connection.execute(
+                "SELECT window_index, current, previous FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+            counters = _slide(_Counters(*row) if row else None, now, window)
+            result = _check(counters, now, limit, window)
+            connection.execute(
+                "INSERT OR REPLACE INTO rate_limits (key, window_index, current, previous, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, counters.window_index, counters.current, counters.previous,
+                 (counters.window_index + 2) * window),
+            )
+            if random.random() < self.CLEANUP_PROBABILITY:
+                connection.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return result
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        return await asyncio.to_thread(self._hit, key, limit, window)
+
+    def _mark(self, key: str, seconds: float) -> None:
+        connection = self._connection()
+        now = time.time()
+        connection.execute("INSERT OR REPLACE INTO markers (key, expires_at) VALUES (?, ?)", (key, now + seconds))
+        if random.random() < self.CLEANUP_PROBABILITY:
+            connection.execute("DELETE FROM markers WHERE expires_at <= ?", (now,))
+
+    def _is_marked(self, key: str) -> bool:
+        row = self._connection().execute(
+            "SELECT 1 FROM markers WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row is not None
+
+    async def mark(self, key: str, seconds: float) -> None:
+        await asyncio.to_thread(self._mark, key, seconds)
+
+    async def is_marked(self, key: str) -> bool:
+        return await asyncio.to_thread(self._is_marked, key)
+
+    async def close(self) -> None:
+        pass  # connections belong to their threads and close with them
+
+    def key_count(self) -> int | None:
+        return None  # not tracked
+
+
+class RedisBackend:
+    """Counters in a Redis-protocol server, checked and updated by one Lua script."""
+
+    # Same arithmetic as _slide() and _check(); returns {allowed, remaining, reset_ms, retry_ms}
+    SCRIPT = """
+    local now, window, limit = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    if limit < 1 then
+        return {0, 0, math.ceil(window * 1000), math.ceil(window * 1000)}
+    end
+    local index = math.floor(now / window)
+    local state = redis.call('HMGET', KEYS[1], 'index', 'current', 'previous')
+    local current, previous = 0, 0
+    local stored = tonumber(state[1])
+    if stored == index then
+        current, previous = tonumber(state[2]), tonumber(state[3])
+    elseif stored == index - 1 then
+        previous = tonumber(state[2])
+    end
+    local elapsed = now - index * window
+    local estimate = previous * (1 - elapsed / window) + current
+    local reset_after = window - elapsed
+    if estimate + 1 <= limit then
+        current = current + 1
+        redis.call('HSET', KEYS[1], 'index', index, 'current', current, 'previous', previous)
+        redis.call('PEXPIREAT', KEYS[1], math.ceil((index + 2) * window * 1000))
+        return {1, math.max(0, math.floor(limit - estimate - 1)), math.ceil(reset_after * 1000), 0}
+    end
+    local retry_after
+    if limit - 1 - current >= 0 then
+        retry_after = window * (1 - (limit - 1 - current) / previous) - elapsed
+    else
+        retry_after = reset_after + window * (1 - (limit - 1) / current)
+    end
+    return {0, 0, math.ceil(reset_after * 1000), math.ceil(math.max(retry_after, 0) * 1000)}
+    """
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        self.url = url
+        self.prefix = prefix
+        self._client = None
+        self._script = None
+
+    def _get_script(self):
+        if self._script is None:
+            import redis.asyncio as redis
+
+            self._client = redis.from_url(self.url)
+            self._script = self._client.register_script(self.SCRIPT)
+        return self._script
+
+    def _get_client(self):
+        self._get_script()
+        return self._client
+
+    async def hit(self, key: str, limit: int, window: float) -> RateLimitResult:
+        allowed, remaining, reset_ms, retry_ms = await self._get_script()(
+            keys=[self.prefix + key], args=[time.time(), window, limit]
+        )
+        return RateLimitResult(bool(allowed), limit, int(remaining), reset_ms / 1000, retry_ms / 1000)
+
+    async def mark(self, key: str, seconds: float) -> None:
+        await self._get_client().set(self.prefix + "marker:" + key, 1, px=max(1, int(seconds * 1000)))
+
+    async def is_marked(self, key: str) -> bool:
+        return bool(await self._get_client().exists(self.prefix + "marker:" + key))
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await getattr(self._client, "aclose", self._client.close)()
+            self._client = None
+            self._script = None
+
+    def key_count(self) -> int | None:
+        return None  # not tracked
+
+
+def default_sqlite_path() -> str:
+    return os.path.join(tempfile.gettempdir(), "klasstra-rate-limits.sqlite3")
+
+
+def create_backend(app_settings: Settings = settings):
+    kind = app_settings.RATE_LIMIT_BACKEND
+    if kind == "sqlite":
+        return SQLiteBackend(app_settings.RATE_LIMIT_SQLITE_PATH or default_sqlite_path())
+    if kind == "redis":
+        if not app_settings.RATE_LIMIT_REDIS_URL:
+            raise ValueError("RATE_LIMIT_BACKEND=redis needs RATE_LIMIT_REDIS_URL")
+        return RedisBackend(app_settings.RATE_LIMIT_REDIS_URL)
+    if kind == "memory":
+        return MemoryBackend(app_settings.RATE_LIMIT_MAX_KEYS)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND {kind!r} (expected sqlite, redis or memory)")
+
+
+_backend = None
+
+
+def get_backend():
+    """This process' backend, created on first use (after any fork)."""
+    global _backend
+    if _backend is None:
+        _backend = create_backend()
+    return _backend
+
+
+async def close_backend() -> None:
+    global _backend
+    if _backend is not None:
+        await _backend.close()
+        _backend = None
+
+
+async def hit(key: str, limit: int, window: float) -> RateLimitResult:
+    """
+    Count a request for key against limit requests per window seconds. If the
+    backend fails, the request is allowed (and counted as an error): an outage
+    of the limiter must not take the API down with it.
+    """
+    try:
+        result = await get_backend().hit(key, limit, window)
+    except Exception as exc:
+        _stats["errors"] += 1
+        print(f"Rate limiter error for {key}: {exc}")
+        return RateLimitResult(True, limit, limit, window, 0.0)
+    _stats["allowed" if result.allowed else "limited"] += 1
+    return result
+
+
+async def mark(key: str, seconds: float) -> None:
+    """Set a marker that is_marked() sees, in every worker, for seconds."""
+    await get_backend().mark(key, seconds)
+
+
+async def is_marked(key: str) -> bool:
+    return await get_backend().is_marked(key)
+
+
+register_metrics("rate_limit", lambda: {
+    "backend": settings.RATE_LIMIT_BACKEND,
+    **_stats,
+    "keys": _backend.key_count() if _backend is not None else 0,
+})
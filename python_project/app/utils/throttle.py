@@ -0,0 +1,182 @@
+# filename: app/utils/throttle.py
+"""
+Per-route throttling policies.
+
+A route opts in with dependencies=[Depends(throttle("<policy>"))]. A policy
+combines up to three limits:
+
+- limit requests per window seconds per client, counted by the shared rate
+  limiter (app/utils/rate_limit.py), so it holds across workers;
+- max_concurrent requests of one client at a time (429 beyond);
+- max_in_flight requests of all clients on this route at a time (503 beyond),
+  so that an expensive route cannot take every worker thread or CPU from the
+  cheap ones.
+
+On top of the policies, THROTTLE_MAX_IN_FLIGHT caps the requests of all
+throttled routes together (503 beyond), which sheds load once the worker is
+saturated whatever the mix of routes.
+
+Concurrency (max_concurrent, max_in_flight, THROTTLE_MAX_IN_FLIGHT) is counted
+per worker process, since that is what it protects: a server with N workers
+takes up to N times these numbers. Only the window limits are shared.
+Clients are identified by user id when the request carries a valid token
+(key="user"), by client IP otherwise or when key="ip". Behind a reverse proxy,
+let uvicorn trust its X-Forwarded-For (app/server.py enables proxy headers; set
+FORWARDED_ALLOW_IPS to the proxy's address), or every client shares its IP.
+
+Throttled responses carry Retry-After. Responses of a route with a window limit
+carry RateLimit-Limit, RateLimit-Remaining, RateLimit-Reset and RateLimit-Policy
+(IETF draft "RateLimit header fields for HTTP"). ThrottleHeadersMiddleware adds
+them to whatever response the route returns, streaming ones included.
+"""
+import math
+from collections import defaultdict
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+
+from app.core.auth import decode_token
+from app.core.config import settings
+from app.core.metrics import register_metrics
+from app.utils import rate_limit
+
+
+@dataclass(frozen=True)
+class Policy:
+    limit: int | None = None  # requests per window per client
+    window: float = 60.0  # seconds
+    max_concurrent: int | None = None  # per client, per worker
+    max_in_flight: int | None = None  # all clients of this route together, per worker
+    key: str = "user"  # "user" (falls back to the IP without a valid token) or "ip"
+
+
+POLICIES: dict[str, Policy] = {
+    # Password hashing is the expensive part; parents of one school may share an IP
+    "login": Policy(limit=60, window=60, max_concurrent=5, key="ip"),
+    "announcements": Policy(limit=settings.RATE_LIMIT, window=settings.RATE_LIMIT_WINDOW_SECONDS),
+    # Upstream LLM calls take seconds and hold a connection (or thread) meanwhile
+    "ai": Policy(limit=20, window=60, max_concurrent=2, max_in_flight=16),
+    "upload": Policy(limit=60, window=60, max_concurrent=3, max_in_flight=32),
+}
+
+_concurrent: dict[str, int] = defaultdict(int)  # "<policy>:<client>" -> requests in progress
+_in_flight: dict[str, int] = defaultdict(int)  # policy -> requests in progress
+_total = {"in_flight": 0, "rejected": 0}  # all policies together
+_rejected: dict[str, dict[str, int]] = defaultdict(lambda: {"rate": 0, "concurrency": 0, "in_flight": 0})
+
+
+# RateLimit-* headers for the response of the current request (see the middleware)
+_response_headers: ContextVar[dict[str, str] | None] = ContextVar("throttle_response_headers", default=None)
+
+
+class ThrottleHeadersMiddleware:
+    """Adds the RateLimit-* headers set by throttle() to the response."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers: dict[str, str] = {}
+        token = _response_headers.set(headers)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and headers:
+                message = {
+                    **message,
+                    "headers": list(message.get("headers", []))
+                    + [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _response_headers.reset(token)
+
+
+def client_key(request: Request, key: str) -> str:
+    if key == "user":
+        authorization = request.headers.get("authorization", "")
+        scheme, _, token = authorization.partition(" ")
+        if scheme.lower() == "bearer" and token:
+            try:
+                return f"user:{decode_token(token).user_id}"
+            except HTTPException:
+                pass  # the route's own authentication rejects it
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def _throttled(status_code: int, detail: str, retry_after: float, headers: dict | None = None) -> HTTPException:
+    headers = {**(headers or {}), "Retry-After": str(max(1, math.ceil(retry_after)))}
+    return HTTPException(status_code=status_code, detail=detail, headers=headers)
+
+
+def _release(name: str, concurrency_key: str) -> None:
+    _total["in_flight"] -= 1
+    _in_flight[name] -= 1
+    _concurrent[concurrency_key] -= 1
+    if _concurrent[concurrency_key] <= 0:
+        del _concurrent[concurrency_key]
+
+
+def throttle(name: str):
+    """A dependency enforcing POLICIES[name] for the route."""
+    policy = POLICIES[name]
+
+    async def dependency(request: Request):
+        if not settings.THROTTLE_ENABLED:
+            yield
+            return
+        client = client_key(request, policy.key)
+        concurrency_key = f"{name}:{client}"
+
+        # Take the slots first, so that concurrent requests cannot all slip
+        # through while the window check awaits the shared store
+        _total["in_flight"] += 1
+        _in_flight[name] += 1
+        _concurrent[concurrency_key] += 1
+        try:
+            if 0 < settings.THROTTLE_MAX_IN_FLIGHT < _total["in_flight"]:
+                _total["rejected"] += 1
+                raise _throttled(503, "Server busy, please try again", 1)
+            if policy.max_in_flight is not None and _in_flight[name] > policy.max_in_flight:
+                _rejected[name]["in_flight"] += 1
+                raise _throttled(503, "Server busy, please try again", 1)
+            if policy.max_concurrent is not None and _concurrent[concurrency_key] > policy.max_concurrent:
+                _rejected[name]["concurrency"] += 1
+                raise _throttled(429, "Too many concurrent requests", 1)
+            if policy.limit is not None:
+                result = await rate_limit.hit(f"{name}:{client}", policy.limit, policy.window)
+                headers = {
+                    "RateLimit-Limit": str(result.limit),
+                    "RateLimit-Remaining": str(result.remaining),
+                    "RateLimit-Reset": str(math.ceil(result.reset_after)),
+                    "RateLimit-Policy": f"{policy.limit};w={policy.window:g}",
+                }
+                if not result.allowed:
+                    _rejected[name]["rate"] += 1
+                    raise _throttled(429, "Rate limit exceeded", result.retry_after, headers)
+                response_headers = _response_headers.get()
+                if response_headers is not None:
+                    response_headers.update(headers)
+        except BaseException:
+            _release(name, concurrency_key)
+            raise
+
+        try:
+            yield
+        finally:
+            _release(name, concurrency_key)
+
+    return dependency
+
+
+register_metrics("throttle", lambda: {
+    "total": {**_total, "max_in_flight": settings.THROTTLE_MAX_IN_FLIGHT},
+    **{name: {"in_flight": _in_flight.get(name, 0), "rejected": dict(_rejected[name])} for name in POLICIES},
+})
@@ -0,0 +1,12 @@
+# filename: app/worker.py
+from uvicorn.workers import UvicornWorker as _BaseUvicornWorker
+from app.core.config import settings
+
+
+class UvicornWorker(_BaseUvicornWorker):
+    """gunicorn worker class honouring SERVER_LOOP / SERVER_HTTP (keep-alive comes from gunicorn's own setting)."""
+
+    CONFIG_KWARGS = {
+        "loop": settings.SERVER_LOOP,
+        "http": settings.SERVER_HTTP,
+    }
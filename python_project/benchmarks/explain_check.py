@@ -0,0 +1,162 @@
+# filename: benchmarks/explain_check.py
+"""
+Check that the feed queries use their indexes.
+
+    cd python_project
+    DATABASE_URL=... python -m app.generate_dataset --announcements 300000
+    DATABASE_URL=... python benchmarks/explain_check.py
+
+Runs EXPLAIN (PostgreSQL) or EXPLAIN QUERY PLAN (SQLite) for the statements
+behind the parent and teacher feeds, for users of the generated dataset, and
+exits with status 1 if one of them scans a table sequentially or does not use
+the expected index. With PARENT_INBOX the inbox feed is checked too. Run it against a filled database: on a nearly empty one the
+planner rightly prefers sequential scans.
+"""
+import sys
+import os
+
+# Add the project root to sys.path to allow imports from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+import argparse
+import json
+
+from sqlalchemy import select, text
+
+from app.core.config import settings
+from app.core.database import init_engine
+from app.models.child import Child
+from app.models.teacher_class import TeacherClass
+from app.models.user import User
+from app.utils.pagination import DEFAULT_PAGE_SIZE
+from app.services.announcements import parent_feed_statement, parent_inbox_feed_statement, teacher_feed_statement
+from app.models import class_, audit_log  # noqa: F401  (register the remaining models)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Assert that the feed queries use index scans.")
+    parser.add_argument("--prefix", default="scale", help="username prefix used by app.generate_dataset")
+    return parser.parse_args(argv)
+
+
+def sample_ids(connection, prefix):
+    """A generated parent with children and a generated teacher with classes."""
+    parent_id = connection.execute(
+        select(Child.parent_id).join(User, User.id == Child.parent_id)
+        .where(User.username.like(f"{prefix}_p%")).order_by(Child.parent_id).limit(1)
+    ).scalar()
+    teacher_id = connection.execute(
+        select(TeacherClass.teacher_id).join(User, User.id == TeacherClass.teacher_id)
+        .where(User.username.like(f"{prefix}_t%")).order_by(TeacherClass.teacher_id).limit(1)
+    ).scalar()
+    if parent_id is None or teacher_id is None:
+        raise SystemExit(f"No generated users with prefix {prefix!r}; run app.generate_dataset first.")
+    return parent_id, teacher_id
+
+
+def feed_queries(connection, parent_id, teacher_id):
+    """
+    (name, statement, expected indexes) for the statements the feeds run; keep in
+    sync with services/announcements.py, routers/announcements.py and routers/children.py.
+    """
+    teacher_class_ids = connection.execute(
+        select(TeacherClass.class_id).where(TeacherClass.teacher_id == teacher_id)
+    ).scalars().all()
+
+    queries = [
+        ("children of a parent",
+         select(Child).where(Child.parent_id == parent_id),
+         {"ix_children_parent_id"}),
+        ("parent feed (first page)",
+         parent_feed_statement(parent_id, None, DEFAULT_PAGE_SIZE),
+         {"ix_children_parent_id", "ix_announcement_recipients_recipient_created_at"}),
+        ("teacher feed (first page)",
+         teacher_feed_statement(teacher_id, None, DEFAULT_PAGE_SIZE),
+         {"ix_announcement_recipients_recipient_created_at", "ix_announcements_created_by_id_created_at"}),
+        ("children of the teacher's classes",
+         select(Child).where(Child.class_id.in_(teacher_class_ids)),
+         {"ix_children_class_id"}),
+    ]
+    if settings.PARENT_INBOX:
+        # Run app.rebuild_parent_inbox first: an empty inbox is scanned sequentially
+        queries.append(("parent inbox feed (first page)",
+                        parent_inbox_feed_statement(parent_id, None, DEFAULT_PAGE_SIZE),
+                        {"parent_inbox_pk"}))
+    return queries
+
+
+# Tables the feeds filter on. Lookup tables (users, classes, teacher_classes) are
+# small enough that a sequential scan is often the better plan.
+FILTERED_TABLES = {"announcements", "announcement_recipients", "children", "parent_inbox"}
+
+
+def postgresql_plan(connection, sql):
+    """[(table, index or None)] for every scan node; index is None for sequential scans."""
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    scans = []
+
+    def walk(node):
+        if node["Node Type"] == "Seq Scan":
+            scans.append((node["Relation Name"], None))
+        elif "Index Name" in node:
+            scans.append((node.get("Relation Name"), node["Index Name"]))
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(plan[0]["Plan"])
+    return scans
+
+
+def sqlite_plan(connection, sql):
+    scans = []
+    for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")):
+        words = row.detail.split()
+        if words[0] not in ("SCAN", "SEARCH"):
+            continue
+        table = words[1]
+        index = None
+        if "INDEX" in words:
+            index = words[words.index("INDEX") + 1]
+        elif "PRIMARY" in words or "INTEGER" in words:
+            index = "PRIMARY KEY"
+        scans.append((table, index))
+    return scans
+
+
+def check(connection, name, statement, expected):
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    if connection.dialect.name == "postgresql":
+        scans = postgresql_plan(connection, sql)
+    else:
+        scans = sqlite_plan(connection, sql)
+    used = {index for _, index in scans if index}
+    problems = [f"sequential scan on {table}" for table, index in scans if table in FILTERED_TABLES and not index]
+    problems += [f"{index} not used" for index in sorted(expected - used)]
+    status = "ok" if not problems else "FAIL"
+    print(f"{status:<5}{name:<38}{', '.join(sorted(used)) or '-'}")
+    for problem in problems:
+        print(f"       {problem}")
+    return not problems
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    engine = init_engine()
+    with engine.connect() as connection:
+        parent_id, teacher_id = sample_ids(connection, args.prefix)
+        results = [
+            check(connection, name, statement, expected)
+            for name, statement, expected in feed_queries(connection, parent_id, teacher_id)
+        ]
+    if not all(results):
+        print("\nSome feed queries do not use their indexes.")
+        sys.exit(1)
+    print("\nAll feed queries use index scans.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+# filename: benchmarks/run_benchmarks.py
+"""
+Endpoint benchmark suite.
+
+    cd python_project
+    # fill a database first, e.g.
+    DATABASE_URL=sqlite:///bench.db python benchmarks/run_benchmarks.py --create-schema --generate
+    # then, against the same database
+    DATABASE_URL=... python benchmarks/run_benchmarks.py --concurrency 32 --requests 2000
+
+By default the app runs in-process (httpx ASGI transport, lifespan included) so
+the numbers measure the application and database, not the network. Pass --url
+to drive an already running server instead (start it with
+SQL_QUERY_COUNT_HEADER=true to get statement counts).
+
+The upload scenario stores real files. In-process they go to a temporary
+UPLOAD_DIR that is deleted after the run; a server given with --url keeps them
+in its own UPLOAD_DIR.
+
+Results (p50/p95/p99 latency, throughput, SQL statements per request, errors)
+are printed and written as JSON to benchmarks/results/<git sha>.json; pass
+--compare <older results file> to print the relative change per scenario.
+"""
+import sys
+import os
+import shutil
+import tempfile
+
+# Add the project root to sys.path to allow imports from 'app'
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, '..'))
+sys.path.insert(0, project_root)
+
+# The app reads its settings at import time; statement counting must be on.
+os.environ.setdefault("SQL_QUERY_COUNT_HEADER", "true")
+os.environ.setdefault("SEED_ON_STARTUP", "false")
+# Every benchmark request comes from one client; measure the routes, not the throttling
+os.environ.setdefault("THROTTLE_ENABLED", "false")
+# Files of the upload scenario; removed after the run unless UPLOAD_DIR was given
+_temporary_upload_dir = None
+if "UPLOAD_DIR" not in os.environ:
+    _temporary_upload_dir = os.environ["UPLOAD_DIR"] = tempfile.mkdtemp(prefix="klasstra-bench-uploads-")
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+SCENARIOS = ["login", "parent_feed", "children_my", "teacher_feed", "teacher_post", "upload"]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the hot API routes.")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests per scenario")
+    parser.add_argument("--users", type=int, default=50, help="distinct parents/teachers to log in as")
+    parser.add_argument("--prefix", default="scale", help="username prefix used by app.generate_dataset")
+    parser.add_argument("--password", default="12341234")
+    parser.add_argument("--create-schema", action="store_true",
+                        help="create the tables from the models and stamp Alembic head (fresh SQLite files)")
+    parser.add_argument("--generate", action="store_true",
+                        help="fill the database with app.generate_dataset before benchmarking")
+    parser.add_argument("--classes", type=int, default=50)
+    parser.add_argument("--parents", type=int, default=2_000)
+    parser.add_argument("--children", type=int, default=4_000)
+    parser.add_argument("--announcements", type=int, default=100_000)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<git sha>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    return parser.parse_args(argv)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_root, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def prepare_database(args):
+    from app.core.database import Base, init_engine
+    from app.core.startup import get_alembic_config
+    from app import generate_dataset
+    from alembic import command
+    # Register every model with Base.metadata
+    from app.models import user, class_, announcement, announcement_recipient, child, audit_log, teacher_class, parent_inbox, announcement_change  # noqa: F401
+
+    if args.create_schema:
+        Base.metadata.create_all(init_engine())
+        command.stamp(get_alembic_config(), "head")
+    if args.generate:
+        counts = generate_dataset.generate(generate_dataset.parse_args([
+            "--classes", str(args.classes), "--parents", str(args.parents),
+            "--children", str(args.children), "--announcements", str(args.announcements),
+            "--prefix", args.prefix, "--password", args.password,
+        ]))
+        print("Generated:", ", ".join(f"{table}={count}" for table, count in counts.items()))
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class Scenario:
+    """One route under test; request(i) returns the kwargs for the i-th request."""
+
+    def __init__(self, name, method, path, request):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.request = request
+
+
+async def login(client, username, password):
+    response = await client.post("/auth/login", data={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def build_scenarios(client, args, selected):
+    parents = [f"{args.prefix}_p{n:06d}" for n in range(1, args.users + 1)]
+    teachers = [f"{args.prefix}_t{n:06d}" for n in range(1, args.users + 1)]
+
+    parent_headers, teacher_headers = [], []
+    if selected & {"parent_feed", "children_my"}:
+        parent_headers = [await login(client, name, args.password) for name in parents]
+    if selected & {"teacher_feed", "teacher_post"}:
+        # Generated datasets may have fewer teachers than --users
+        for name in teachers:
+            try:
+                teacher_headers.append(await login(client, name, args.password))
+            except httpx.HTTPStatusError:
+                break
+
+    teacher_classes = []
+    if "teacher_post" in selected:
+        for headers in teacher_headers:
+            response = await client.get("/teacher/my-classes", headers=headers)
+            response.raise_for_status()
+            teacher_classes.append([c["id"] for c in response.json()])
+
+    def pick(items, i):
+        return items[i % len(items)]
+
+    scenarios = {
+        "login": Scenario("login", "POST", "/auth/login", lambda i: {
+            "data": {"username": pick(parents, i), "password": args.password}}),
+        "parent_feed": Scenario("parent_feed", "GET", "/announcements/for_parent", lambda i: {
+            "headers": pick(parent_headers, i)}),
+        "children_my": Scenario("children_my", "GET", "/children/my", lambda i: {
+            "headers": pick(parent_headers, i)}),
+        "teacher_feed": Scenario("teacher_feed", "GET", "/teacher/my-announcements", lambda i: {
+            "headers": pick(teacher_headers, i)}),
+        "teacher_post": Scenario("teacher_post", "POST", "/teacher/announcements", lambda i: {
+            "headers": pick(teacher_headers, i),
+            "json": {"title": f"Benchmark {i}", "body": "Benchmark announcement body.",
+                     "classes": pick(teacher_classes, i)}}),
+        "upload": Scenario("upload", "POST", "/upload/", lambda i: {
+            "files": {"file": (f"bench-{i}.txt", b"x" * 4096, "text/plain")}}),
+    }
+    return [scenarios[name] for name in SCENARIOS if name in selected]
+
+
+async def run_scenario(client, scenario, args):
+    latencies, statements, errors = [], [], {}
+    next_index = 0
+
+    async def worker(total, record):
+        nonlocal next_index
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            started = time.perf_counter()
+            response = await client.request(scenario.method, scenario.path, **scenario.request(i))
+            elapsed = time.perf_counter() - started
+            if not record:
+                continue
+            if response.status_code >= 400:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+                continue
+            latencies.append(elapsed)
+            count = response.headers.get("x-sql-queries")
+            if count is not None:
+                statements.append(int(count))
+
+    await asyncio.gather(*(worker(args.warmup, False) for _ in range(args.concurrency)))
+    next_index = 0
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(args.requests, True) for _ in range(args.concurrency)))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda value: None if value is None else round(value * 1000, 2)
+    return {
+        "method": scenario.method,
+        "path": scenario.path,
+        "requests": args.requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "latency_ms": {
+            "mean": ms(statistics.fmean(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 0.50)),
+            "p95": ms(percentile(latencies, 0.95)),
+            "p99": ms(percentile(latencies, 0.99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "sql_statements_per_request": round(statistics.fmean(statements), 2) if statements else None,
+    }
+
+
+async def run(args):
+    selected = {name.strip() for name in args.scenarios.split(",") if name.strip()}
+    unknown = selected - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+            return await run_all(client, args, selected)
+
+    from app.main import app
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits, timeout=60) as client:
+            return await run_all(client, args, selected)
+
+
+async def run_all(client, args, selected):
+    results = {}
+    for scenario in await build_scenarios(client, args, selected):
+        print(f"Running {scenario.name} ({scenario.method} {scenario.path})...")
+        results[scenario.name] = await run_scenario(client, scenario, args)
+    return results
+
+
+def print_report(results, baseline=None):
+    header = f"{'scenario':<14}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>9}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        latency = result["latency_ms"]
+        sql = result["sql_statements_per_request"]
+        print(f"{name:<14}{result['throughput_rps'] or 0:>9}{latency['p50'] or 0:>10}{latency['p95'] or 0:>10}"
+              f"{latency['p99'] or 0:>10}{'-' if sql is None else sql:>9}{sum(result['errors'].values()):>8}")
+
+    if not baseline:
+        return
+    print(f"\nCompared with {baseline['git_revision']} ({baseline['timestamp']}):")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            continue
+        changes = []
+        for label, now, then in (
+            ("p95", result["latency_ms"]["p95"], before["latency_ms"]["p95"]),
+            ("rps", result["throughput_rps"], before["throughput_rps"]),
+            ("sql/req", result["sql_statements_per_request"], before["sql_statements_per_request"]),
+        ):
+            if now is not None and then:
+                changes.append(f"{label} {(now - then) / then * 100:+.1f}%")
+        print(f"  {name:<14}{'  '.join(changes)}")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.create_schema or args.generate:
+        prepare_database(args)
+
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        if _temporary_upload_dir is not None:
+            shutil.rmtree(_temporary_upload_dir, ignore_errors=True)
+    if args.url and "upload" in results:
+        print(f"Note: the upload scenario left {results['upload']['ok']} files in the server's UPLOAD_DIR.")
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print()
+    print_report(results, baseline)
+
+    revision = git_revision()
+    output = args.output or os.path.join(current_dir, "results", f"{revision}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    report = {
+        "git_revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "in-process",
+        "database": os.getenv("DATABASE_URL", "").split("@")[-1],  # never write credentials
+        "python": platform.python_version(),
+        "config": {"concurrency": args.concurrency, "requests": args.requests, "users": args.users},
+        "results": results,
+    }
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+# filename: gunicorn.conf.py
+# Usage (from python_project directory):
+#   gunicorn app.main:app --preload
+# gunicorn picks this file up automatically from the working directory.
+from app.core.config import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WEB_CONCURRENCY
+# UvicornWorker configured with SERVER_LOOP / SERVER_HTTP
+worker_class = "app.worker.UvicornWorker"
+keepalive = settings.KEEPALIVE_TIMEOUT
+# Time given to workers to finish in-flight requests after SIGTERM
+graceful_timeout = settings.GRACEFUL_TIMEOUT
+
+
+def on_starting(server):
+    # Runs once in the master, before any worker is forked.
+    from app.core.database import init_engine, dispose_engine
+    from app.core.startup import mark_database_prepared, prepare_database, share_jwt_secret
+
+    share_jwt_secret(settings)
+    prepare_database(init_engine(settings), settings)
+    mark_database_prepared()
+    # Workers build their own engine in the lifespan hook; anything left over from
+    # the master is discarded after fork (see os.register_at_fork in app/core/database.py).
+    dispose_engine()
+
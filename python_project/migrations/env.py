@@ -14,7 +14,7 @@ from app.core.config import settings  # Import your Settings
 from app.core.database import Base      # Import your SQLAlchemy Base
 
 # Import all your models so that they are registered with Base.metadata
-from app.models import user, class_, announcement, child, audit_log
+from app.models import user, class_, announcement, announcement_recipient, child, audit_log, teacher_class, parent_inbox, announcement_change
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -25,7 +25,8 @@ config.set_main_option("sqlalchemy.url", settings.SQLALCHEMY_DATABASE_URI)
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-if config.config_file_name is not None:
+# Skipped when the app runs migrations itself so uvicorn's loggers stay intact.
+if config.config_file_name is not None and "connection" not in config.attributes:
     fileConfig(config.config_file_name)
 
 # Set the target metadata for 'autogenerate' support
@@ -69,6 +70,13 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # The app passes its own connection (see app/core/startup.py) so that migrations
+    # run while it holds the migration lock.
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section),
         prefix="sqlalchemy.",
@@ -76,14 +84,21 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-            compare_type=True,  # Ensures that column types are compared
-        )
-
-        with context.begin_transaction():
-            context.run_migrations()
+        do_run_migrations(connection)
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        compare_type=True,  # Ensures that column types are compared
+        # One transaction per revision: revisions that build indexes concurrently
+        # commit in autocommit blocks, which must not split an earlier revision.
+        transaction_per_migration=True,
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
 
 
 if context.is_offline_mode():
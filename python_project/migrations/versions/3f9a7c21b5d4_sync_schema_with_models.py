@@ -0,0 +1,89 @@
+"""Sync schema with models
+
+Revision ID: 3f9a7c21b5d4
+Revises: da11abc7f593
+Create Date: 2026-10-18 09:12:44.318204
+
+Until now the app rebuilt its tables with create_all() on every start, so the
+schema drifted away from the initial migration. This brings a database created
+by the initial migration in line with the models. Every step checks the live
+schema first, so it is also safe on databases that were built by create_all()
+and then stamped at the initial revision.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9a7c21b5d4'
+down_revision: Union[str, None] = 'da11abc7f593'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns(inspector, table: str) -> set[str]:
+    return {column["name"] for column in inspector.get_columns(table)}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    announcement_columns = _columns(inspector, 'announcements')
+    with op.batch_alter_table('announcements') as batch_op:
+        if 'created_by' in announcement_columns:
+            batch_op.alter_column('created_by', new_column_name='created_by_id', existing_type=sa.Integer(), existing_nullable=False)
+        if 'last_updated_by' in announcement_columns:
+            batch_op.alter_column('last_updated_by', new_column_name='last_updated_by_id', existing_type=sa.Integer(), existing_nullable=True)
+        if 'attachment_url' not in announcement_columns:
+            batch_op.add_column(sa.Column('attachment_url', sa.String(), nullable=True))
+
+    children_columns = _columns(inspector, 'children')
+    if 'class_id' not in children_columns:
+        op.add_column('children', sa.Column('class_id', sa.Integer(), nullable=True))
+        if 'class_name' in children_columns:
+            # Make sure every class referenced by name exists, then resolve the ids.
+            op.execute(
+                "INSERT INTO classes (name) "
+                "SELECT DISTINCT class_name FROM children "
+                "WHERE class_name NOT IN (SELECT name FROM classes)"
+            )
+            op.execute(
+                "UPDATE children SET class_id = "
+                "(SELECT classes.id FROM classes WHERE classes.name = children.class_name)"
+            )
+        with op.batch_alter_table('children') as batch_op:
+            batch_op.alter_column('class_id', existing_type=sa.Integer(), nullable=False)
+            batch_op.create_foreign_key('fk_children_class_id_classes', 'classes', ['class_id'], ['id'])
+            if 'class_name' in children_columns:
+                batch_op.drop_column('class_name')
+
+    if not inspector.has_table('teacher_classes'):
+        op.create_table('teacher_classes',
+        sa.Column('teacher_id', sa.Integer(), nullable=False),
+        sa.Column('class_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+        sa.ForeignKeyConstraint(['teacher_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('teacher_id', 'class_id', name='teacher_class_pk')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('teacher_classes')
+
+    op.add_column('children', sa.Column('class_name', sa.String(), nullable=True))
+    op.execute(
+        "UPDATE children SET class_name = "
+        "(SELECT classes.name FROM classes WHERE classes.id = children.class_id)"
+    )
+    with op.batch_alter_table('children') as batch_op:
+        batch_op.alter_column('class_name', existing_type=sa.String(), nullable=False)
+        batch_op.drop_constraint('fk_children_class_id_classes', type_='foreignkey')
+        batch_op.drop_column('class_id')
+
+    with op.batch_alter_table('announcements') as batch_op:
+        batch_op.drop_column('attachment_url')
+        batch_op.alter_column('last_updated_by_id', new_column_name='last_updated_by', existing_type=sa.Integer(), existing_nullable=True)
+        batch_op.alter_column('created_by_id', new_column_name='created_by', existing_type=sa.Integer(), existing_nullable=False)
@@ -0,0 +1,72 @@
+"""Add indexes for the announcement feeds
+
+Revision ID: 8c4e2d9a1f37
+Revises: 3f9a7c21b5d4
+Create Date: 2026-10-18 14:03:51.902117
+
+The parent feed filters announcements on (recipient_type, recipient_id), the
+teacher feed on recipient or created_by_id, and both resolve classes through
+children / teacher_classes. None of those columns were indexed.
+
+The recipient index is a full composite index rather than one partial index per
+recipient type: the feeds pass the type as a bound parameter, and PostgreSQL
+cannot match a generic plan for a prepared statement (asyncpg) against a partial
+index predicate.
+
+On PostgreSQL the indexes are built with CREATE INDEX CONCURRENTLY so the
+migration does not block writes on a live database. That cannot run inside a
+transaction, so each statement runs in an autocommit block. A concurrent build
+that fails leaves an INVALID index behind; drop it and rerun the migration.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4e2d9a1f37'
+down_revision: Union[str, None] = '3f9a7c21b5d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_announcements_recipient_created_at', 'announcements', ['recipient_type', 'recipient_id', 'created_at']),
+    ('ix_announcements_created_by_id_created_at', 'announcements', ['created_by_id', 'created_at']),
+    ('ix_children_parent_id', 'children', ['parent_id']),
+    ('ix_children_class_id', 'children', ['class_id']),
+    ('ix_teacher_classes_class_id', 'teacher_classes', ['class_id']),
+]
+
+
+def _existing_indexes(table: str) -> set[str]:
+    inspector = sa.inspect(op.get_bind())
+    return {index["name"] for index in inspector.get_indexes(table)}
+
+
+def _concurrently() -> bool:
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        # Databases built by create_all() already have them
+        if name in _existing_indexes(table):
+            continue
+        if _concurrently():
+            with op.get_context().autocommit_block():
+                op.create_index(name, table, columns, postgresql_concurrently=True)
+        else:
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(INDEXES):
+        if name not in _existing_indexes(table):
+            continue
+        if _concurrently():
+            with op.get_context().autocommit_block():
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+        else:
+            op.drop_index(name, table_name=table)
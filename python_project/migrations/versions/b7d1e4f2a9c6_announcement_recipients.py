@@ -0,0 +1,128 @@
+"""Store each announcement once with an announcement_recipients table
+
+Revision ID: b7d1e4f2a9c6
+Revises: 8c4e2d9a1f37
+Create Date: 2026-10-18 16:27:05.413880
+
+Announcements used to be copied once per recipient (class or parent). The
+copies made by one request share author, title, body, attachment and
+created_at, because created_at was the transaction's now(). Each such group is
+folded into its lowest id. The recipients of the whole group move to
+announcement_recipients, and the other copies are deleted.
+
+This rewrites the announcements table. Run it in a maintenance window, not
+while the app serves traffic.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d1e4f2a9c6'
+down_revision: Union[str, None] = '8c4e2d9a1f37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('announcement_recipients',
+    sa.Column('announcement_id', sa.Integer(), nullable=False),
+    sa.Column('recipient_type', sa.String(), nullable=False),
+    sa.Column('recipient_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['announcement_id'], ['announcements.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('announcement_id', 'recipient_type', 'recipient_id', name='announcement_recipient_pk')
+    )
+
+    # Rows without created_at could not be matched to their group below
+    op.execute("UPDATE announcements SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+    # Every copy contributes its recipient to the lowest id of its group
+    op.execute("""
+        INSERT INTO announcement_recipients (announcement_id, recipient_type, recipient_id, created_at)
+        SELECT DISTINCT keeper.id, a.recipient_type, a.recipient_id, a.created_at
+        FROM announcements a
+        JOIN (
+            SELECT MIN(id) AS id, created_by_id, title, body,
+                   COALESCE(attachment_url, '') AS attachment_url, created_at
+            FROM announcements
+            GROUP BY created_by_id, title, body, COALESCE(attachment_url, ''), created_at
+        ) keeper
+          ON keeper.created_by_id = a.created_by_id
+         AND keeper.title = a.title
+         AND keeper.body = a.body
+         AND keeper.attachment_url = COALESCE(a.attachment_url, '')
+         AND keeper.created_at = a.created_at
+    """)
+    op.execute("""
+        DELETE FROM announcements
+        WHERE NOT EXISTS (
+            SELECT 1 FROM announcement_recipients r WHERE r.announcement_id = announcements.id
+        )
+    """)
+
+    # Built after the backfill, which is faster than maintaining it row by row
+    op.create_index(
+        'ix_announcement_recipients_recipient_created_at', 'announcement_recipients',
+        ['recipient_type', 'recipient_id', 'created_at', 'announcement_id'],
+    )
+
+    op.drop_index('ix_announcements_recipient_created_at', table_name='announcements')
+    with op.batch_alter_table('announcements') as batch_op:
+        batch_op.drop_column('recipient_type')
+        batch_op.drop_column('recipient_id')
+
+    # The teacher feed now reads (id, created_at) of the teacher's announcements
+    # from this index alone
+    op.drop_index('ix_announcements_created_by_id_created_at', table_name='announcements')
+    op.create_index(
+        'ix_announcements_created_by_id_created_at', 'announcements', ['created_by_id', 'created_at', 'id'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_announcements_created_by_id_created_at', table_name='announcements')
+    op.create_index(
+        'ix_announcements_created_by_id_created_at', 'announcements', ['created_by_id', 'created_at'],
+    )
+
+    with op.batch_alter_table('announcements') as batch_op:
+        batch_op.add_column(sa.Column('recipient_type', sa.String(), nullable=True))
+        batch_op.add_column(sa.Column('recipient_id', sa.Integer(), nullable=True))
+
+    # The first recipient stays on the announcement itself...
+    first_recipient = """
+        SELECT r.{column} FROM announcement_recipients r
+        WHERE r.announcement_id = announcements.id
+        ORDER BY r.recipient_type, r.recipient_id
+        LIMIT 1
+    """
+    op.execute(
+        "UPDATE announcements SET "
+        f"recipient_type = ({first_recipient.format(column='recipient_type')}), "
+        f"recipient_id = ({first_recipient.format(column='recipient_id')})"
+    )
+    # ...and every other recipient gets its own copy again
+    op.execute("""
+        INSERT INTO announcements (title, body, created_by_id, last_updated_by_id, attachment_url,
+                                   created_at, updated_at, recipient_type, recipient_id)
+        SELECT a.title, a.body, a.created_by_id, a.last_updated_by_id, a.attachment_url,
+               a.created_at, a.updated_at, r.recipient_type, r.recipient_id
+        FROM announcements a
+        JOIN announcement_recipients r ON r.announcement_id = a.id
+        WHERE NOT (r.recipient_type = a.recipient_type AND r.recipient_id = a.recipient_id)
+    """)
+    op.execute("DELETE FROM announcements WHERE recipient_type IS NULL")
+
+    with op.batch_alter_table('announcements') as batch_op:
+        batch_op.alter_column('recipient_type', existing_type=sa.String(), nullable=False)
+        batch_op.alter_column('recipient_id', existing_type=sa.Integer(), nullable=False)
+    op.create_index(
+        'ix_announcements_recipient_created_at', 'announcements',
+        ['recipient_type', 'recipient_id', 'created_at'],
+    )
+
+    op.drop_index('ix_announcement_recipients_recipient_created_at', table_name='announcement_recipients')
+    op.drop_table('announcement_recipients')
@@ -0,0 +1,38 @@
+"""Add the parent_inbox table
+
+Revision ID: c5a8e3f1d2b7
+Revises: b7d1e4f2a9c6
+Create Date: 2026-10-18 18:12:40.561203
+
+Fan-out-on-write inbox for the parent feed, used when PARENT_INBOX is on. The
+table is created empty; fill it with "python -m app.rebuild_parent_inbox"
+before turning the setting on.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5a8e3f1d2b7'
+down_revision: Union[str, None] = 'b7d1e4f2a9c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('parent_inbox',
+    sa.Column('parent_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('announcement_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['announcement_id'], ['announcements.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['parent_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('parent_id', 'created_at', 'announcement_id', name='parent_inbox_pk')
+    )
+    op.create_index('ix_parent_inbox_announcement_id', 'parent_inbox', ['announcement_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_parent_inbox_announcement_id', table_name='parent_inbox')
+    op.drop_table('parent_inbox')
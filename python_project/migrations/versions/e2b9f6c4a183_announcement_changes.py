@@ -0,0 +1,41 @@
+"""Add the announcement_changes log for delta sync
+
+Revision ID: e2b9f6c4a183
+Revises: c5a8e3f1d2b7
+Create Date: 2026-10-18 20:41:17.208359
+
+Created empty: clients start syncing from the current position, so earlier
+announcements need no log rows.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b9f6c4a183'
+down_revision: Union[str, None] = 'c5a8e3f1d2b7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('announcement_changes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('announcement_id', sa.Integer(), nullable=False),
+    sa.Column('change', sa.String(), nullable=False),
+    sa.Column('recipient_type', sa.String(), nullable=False),
+    sa.Column('recipient_id', sa.Integer(), nullable=False),
+    sa.Column('changed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_announcement_changes_recipient_id', 'announcement_changes',
+                    ['recipient_type', 'recipient_id', 'id'])
+    op.create_index('ix_announcement_changes_changed_at', 'announcement_changes', ['changed_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_announcement_changes_changed_at', table_name='announcement_changes')
+    op.drop_index('ix_announcement_changes_recipient_id', table_name='announcement_changes')
+    op.drop_table('announcement_changes')
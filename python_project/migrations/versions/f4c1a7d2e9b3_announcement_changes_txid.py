@@ -0,0 +1,38 @@
+"""Record the writing transaction of announcement_changes rows
+
+Revision ID: f4c1a7d2e9b3
+Revises: e2b9f6c4a183
+Create Date: 2026-10-19 09:12:44.530218
+
+On PostgreSQL delta sync orders the change log by (txid, id), which follows
+commit order. Existing rows are all committed: they get txid 0 and stay first.
+The column is NOT NULL on PostgreSQL and left NULL elsewhere.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4c1a7d2e9b3'
+down_revision: Union[str, None] = 'e2b9f6c4a183'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('announcement_changes', sa.Column('txid', sa.BigInteger(), nullable=True))
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("UPDATE announcement_changes SET txid = 0")
+        # Always set there (by default, txid_current()): sync compares the bare
+        # column so that the index below serves it
+        op.alter_column('announcement_changes', 'txid', nullable=False)
+    op.create_index('ix_announcement_changes_recipient_txid', 'announcement_changes',
+                    ['recipient_type', 'recipient_id', 'txid', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_announcement_changes_recipient_txid', table_name='announcement_changes')
+    with op.batch_alter_table('announcement_changes') as batch_op:
+        batch_op.drop_column('txid')
@@ -0,0 +1,45 @@
+// filename: vue_js_project/src/plugins/aiStream.js
+import axios from './axios.js';
+
+// Streamed AI answers (Server-Sent Events from /ai/generate/stream and
+// /ai/chat/stream). onDelta gets each piece of text as the model writes it.
+// Resolves with { cached } once the text is complete; rejects on errors.
+// Abort the signal (an AbortController's) to stop: the server then stops the
+// model as well. EventSource only sends GET requests, hence fetch().
+export async function streamAI(path, body, { token, onDelta, signal }) {
+  const res = await fetch(`${axios.defaults.baseURL}${path}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${token}` },
+    body: JSON.stringify(body),
+    signal,
+  });
+  if (!res.ok) {
+    const error = await res.json().catch(() => ({}));
+    throw new Error(error.detail || `AI request failed (${res.status})`);
+  }
+
+  const reader = res.body.pipeThrough(new TextDecoderStream()).getReader();
+  let buffer = '';
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) throw new Error('The AI stream ended early.');
+    buffer += value;
+    // Events are separated by a blank line
+    let end;
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (!data) continue;
+      const payload = JSON.parse(data);
+      if (event === 'done') return payload;
+      if (event === 'error') throw new Error(payload.detail);
+      onDelta(payload.delta);
+    }
+  }
+}
@@ -0,0 +1,56 @@
+// filename: vue_js_project/src/plugins/announcementEvents.js
+import axios from './axios.js';
+
+// Milliseconds to wait before reopening a closed stream
+const RECONNECT_MS = 3000;
+
+// Live announcement updates (Server-Sent Events from /announcements/stream).
+// onChange runs when the stream (re)opens and on every "created" or "updated"
+// event: events sent while disconnected are not replayed, so the caller reloads
+// its feed. onDelete gets the id of a deleted announcement.
+// Returns a handle; close() it when the page unmounts.
+export function openAnnouncementStream(token, { onChange, onDelete }) {
+  let source = null;
+  let timer = null;
+  let closed = false;
+
+  const reconnect = () => {
+    if (!closed) timer = setTimeout(connect, RECONNECT_MS);
+  };
+
+  // EventSource cannot send an Authorization header, and URLs end up in access
+  // logs: every connection gets its own short-lived stream ticket instead of
+  // the access token. The ticket expires, so rather than letting EventSource
+  // reconnect with the old URL, a closed stream is reopened with a new ticket.
+  const connect = async () => {
+    let ticket;
+    try {
+      const res = await axios.post('/announcements/stream-ticket', null, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      ticket = res.data.ticket;
+    } catch {
+      reconnect();
+      return;
+    }
+    if (closed) return;
+    source = new EventSource(`${axios.defaults.baseURL}/announcements/stream?ticket=${encodeURIComponent(ticket)}`);
+    source.onopen = () => onChange();
+    source.onerror = () => {
+      source.close();
+      reconnect();
+    };
+    source.addEventListener('created', () => onChange());
+    source.addEventListener('updated', () => onChange());
+    source.addEventListener('deleted', (event) => onDelete(JSON.parse(event.data).id));
+  };
+
+  connect();
+  return {
+    close() {
+      closed = true;
+      clearTimeout(timer);
+      if (source) source.close();
+    },
+  };
+}